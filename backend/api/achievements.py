@@ -1,19 +1,25 @@
-from typing import List
-from fastapi import APIRouter, Query
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
 
 from services.summary import SummaryService
+from serializers import json_response
 
 router = APIRouter()
 
 @router.get("/")
 async def list_achievements(
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100)
+    page: Optional[int] = Query(None, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None
 ):
-    """获取成就列表"""
-    offset = (page - 1) * limit
-    achievements = SummaryService.get_achievements(limit=limit, offset=offset)
-    return [
+    """获取成就列表（按日期倒序，下一页游标通过 X-Next-Cursor 返回；page 仅为兼容旧客户端保留）"""
+    offset = (page - 1) * limit if page else 0
+    try:
+        achievements, next_cursor = await SummaryService.get_achievements(limit=limit, offset=offset, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return json_response([
         {
             "id": achievement.id,
             "date_key": achievement.date_key,
@@ -23,12 +29,12 @@ async def list_achievements(
             "summary_md": achievement.summary_md
         }
         for achievement in achievements
-    ]
+    ], headers=headers)
 
 @router.get("/{achievement_id}")
 async def get_achievement(achievement_id: str):
     """获取单个成就详情"""
-    achievement = SummaryService.get_achievement(achievement_id)
+    achievement = await SummaryService.get_achievement(achievement_id)
     if not achievement:
         return {"error": "Achievement not found"}
     
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Query
+
+from services.changes import ChangeService
+
+router = APIRouter()
+
+@router.get("/")
+async def list_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=1000)
+):
+    """获取序号大于 since 的增量变更；reset 为 true 时客户端需重新拉取任务列表"""
+    changes, latest_seq, reset = await ChangeService.since(since, limit=limit)
+    return {
+        "changes": changes,
+        "latest_seq": latest_seq,
+        "has_more": bool(changes) and changes[-1]["seq"] < latest_seq,
+        "reset": reset
+    }
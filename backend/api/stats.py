@@ -0,0 +1,22 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+
+from services.stats import StatsService
+from serializers import json_response
+
+router = APIRouter()
+
+@router.get("/")
+async def get_stats(
+    start: date,
+    end: Optional[date] = None,
+    bucket: str = Query("day", pattern="^(day|week|month|year)$"),
+    breakdown: bool = True
+):
+    """按天/周/月/年汇总一段日期（含首尾，默认到今天）内完成的任务、步骤和时间，可附带按主题和工具的细分"""
+    try:
+        stats = await StatsService.range_stats(start, end or date.today(), bucket=bucket, breakdown=breakdown)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response(stats)
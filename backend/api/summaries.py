@@ -9,7 +9,7 @@ router = APIRouter()
 async def get_today_summary():
     """获取今日总结"""
     today = datetime.now().strftime("%Y-%m-%d")
-    summary = SummaryService.daily(today)
+    summary = await SummaryService.daily(today)
     return {"summary_markdown": summary}
 
 @router.get("/summary/{date}")
@@ -20,7 +20,7 @@ async def get_date_summary(date: str):
         from datetime import datetime
         datetime.strptime(date, "%Y-%m-%d")
         
-        summary = SummaryService.daily(date)
+        summary = await SummaryService.daily(date)
         return {"summary_markdown": summary}
     except ValueError:
         return {"error": "Invalid date format. Use YYYY-MM-DD"}
\ No newline at end of file
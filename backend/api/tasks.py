@@ -1,21 +1,50 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator
 from uuid import UUID
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from services.task import TaskService
+from services.task import TaskService, DEFAULT_TASK_FIELDS
 from services.agent import AgentService
 from services.summary import SummaryService
-from schemas import TaskCreate, TaskUpdate, StepUpdate, TaskResponse
+from services.changes import ChangeService
+from services.search import SearchService
+from schemas import TaskCreate, TaskUpdate, StepUpdate, TaskResponse, StepResponse, StepBatchUpdate, TaskBatchCreate
+from websocket_manager import notify_step_created, notify_task_complete
+from serializers import dumps, json_response, step_response, task_response
+from job_queue import job_queue
 
 router = APIRouter()
 
+async def _stream_task_creation(task: TaskCreate) -> AsyncIterator[str]:
+    """以SSE格式输出流式拆解事件，同时通过WebSocket推送新步骤"""
+    async for event in TaskService.create_streaming(
+        title=task.title,
+        max_steps=task.max_steps,
+        prompt=task.prompt,
+        tools=task.tools,
+        context=task.context,
+        constraints=task.constraints
+    ):
+        if event["type"] == "step_created":
+            await notify_step_created(event["task_id"], event["step"].model_dump(mode="json"))
+            # 客户端按 step 读取步骤文本，完整步骤放在 step_data 中
+            event = {**event, "step": event["step"].content, "step_data": event["step"]}
+        yield f"data: {dumps(event).decode()}\n\n"
+    yield "data: [DONE]\n\n"
+
 @router.post("/")
 async def create_task(task: TaskCreate):
     """创建新任务并自动拆解"""
     try:
-        if task.use_ai:
+        if task.stream:
+            # 流式拆解：步骤边生成边返回
+            return StreamingResponse(
+                _stream_task_creation(task),
+                media_type="text/event-stream"
+            )
+        elif task.use_ai:
             # Use enhanced AI decomposition with configuration
-            return TaskService.create_with_ai(
+            task_data = await TaskService.create_with_ai(
                 title=task.title,
                 max_steps=task.max_steps,
                 prompt=task.prompt,
@@ -25,104 +54,107 @@ async def create_task(task: TaskCreate):
             )
         else:
             # Regular task creation
-            return TaskService.create(task.title)
+            task_data = await TaskService.create(task.title)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return json_response(task_data)
 
 @router.get("/")
-async def list_tasks():
-    """获取所有未完成的任务"""
-    return TaskService.get_incomplete_tasks()
+async def list_tasks(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_steps: bool = True,
+    fields: Optional[str] = None
+):
+    """获取未完成的任务（游标分页，下一页游标通过 X-Next-Cursor 响应头返回，当前变更序号通过 X-Change-Seq 返回）"""
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if not include_steps:
+        field_list = [f for f in (field_list or DEFAULT_TASK_FIELDS) if f != "steps"]
+        field_list += [f for f in ("step_count", "done_count") if f not in field_list]
+    
+    # 先读取变更序号再查询列表：客户端从该序号开始应用增量事件，重复应用同一变更是安全的
+    headers = {"X-Change-Seq": str(await ChangeService.latest_seq())}
+    try:
+        tasks, next_cursor = await TaskService.get_incomplete_page(
+            limit=limit,
+            cursor=cursor,
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return json_response(tasks, headers=headers)
+
+@router.post(":batch")
+async def create_tasks_batch(batch: TaskBatchCreate):
+    """在一个事务中批量创建任务（供离线客户端同步或导入计划），按请求顺序返回每一项的结果"""
+    return json_response({"results": await TaskService.create_batch(batch.tasks, fallback=batch.fallback)})
+
+# 必须注册在 /{task_id} 之前，否则会被当作任务ID匹配
+@router.get("/search")
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    status: str = Query("all", pattern="^(all|open|completed)$"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """按标题和步骤内容检索任务（包括已完成的任务），空格分隔的词都需命中；下一页游标通过 X-Next-Cursor 返回"""
+    try:
+        results, next_cursor = await SearchService.search_tasks(q, status=status, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return json_response(results, headers=headers)
+
+@router.patch("/steps:batch")
+async def update_steps_batch(batch: StepBatchUpdate):
+    """在一个事务中批量更新步骤，按请求顺序返回每一项的结果"""
+    return json_response({"results": await TaskService.update_steps_batch(batch.updates)})
 
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(task_id: UUID):
     """获取单个任务详情"""
-    task = TaskService.get(task_id)
+    task = await TaskService.get(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return TaskResponse(
-        id=task.id,
-        title=task.title,
-        estimated_minutes=task.estimated_minutes,
-        created_at=task.created_at,
-        completed_at=task.completed_at,
-        steps=[
-            {
-                "id": step.id,
-                "task_id": step.task_id,
-                "content": step.content,
-                "tool": step.tool,
-                "theme": step.theme,
-                "deliverable": step.deliverable,
-                "estimate_minutes": step.estimate_minutes,
-                "done": step.done,
-                "order_idx": step.order_idx
-            }
-            for step in task.steps
-        ]
-    )
+    return json_response(task_response(task, task.steps))
 
 @router.patch("/{task_id}", response_model=TaskResponse)
 async def update_task(task_id: UUID, task_update: TaskUpdate):
     """更新任务信息"""
-    task = TaskService.update(task_id, task_update)
+    task = await TaskService.update(task_id, task_update)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return TaskResponse(
-        id=task.id,
-        title=task.title,
-        estimated_minutes=task.estimated_minutes,
-        created_at=task.created_at,
-        completed_at=task.completed_at,
-        steps=[
-            {
-                "id": step.id,
-                "task_id": step.task_id,
-                "content": step.content,
-                "tool": step.tool,
-                "theme": step.theme,
-                "deliverable": step.deliverable,
-                "estimate_minutes": step.estimate_minutes,
-                "done": step.done,
-                "order_idx": step.order_idx
-            }
-            for step in task.steps
-        ]
-    )
+    return json_response(task_response(task, task.steps))
 
-@router.patch("/steps/{step_id}")
+@router.patch("/steps/{step_id}", response_model=StepResponse)
 async def update_step(step_id: UUID, step_update: StepUpdate):
     """更新步骤状态或内容"""
-    step = TaskService.update_step(step_id, step_update)
+    step = await TaskService.update_step(step_id, step_update)
     if not step:
         raise HTTPException(status_code=404, detail="Step not found")
     
-    return {
-        "id": step.id,
-        "task_id": step.task_id,
-        "content": step.content,
-        "tool": step.tool,
-        "theme": step.theme,
-        "deliverable": step.deliverable,
-        "estimate_minutes": step.estimate_minutes,
-        "done": step.done,
-        "order_idx": step.order_idx
-    }
+    return json_response(step_response(step))
 
-@router.post("/{task_id}/complete")
+@router.post("/{task_id}/complete", status_code=202)
 async def complete_task(task_id: UUID):
-    """完成任务并生成总结"""
-    task = TaskService.complete(task_id)
+    """完成任务并生成总结，当日总结在后台生成"""
+    task = await TaskService.complete(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    # 生成总结
+    # 生成总结（只涉及当前任务，开销固定）
     agent = AgentService()
-    summary = agent.compose_summary(str(task_id))
+    summary = await agent.compose_summary(str(task_id))
     
-    # 保存到成就
-    achievement = SummaryService.save(str(task_id), summary)
+    # 成就计数已在完成时增量更新并使当日总结失效；后台队列提前重新生成总结，
+    # 同一天的多次完成只生成一次（读取时如仍过期也会按需生成）
+    date_key = task.completed_at.strftime("%Y-%m-%d")
+    job_queue.submit(f"summary:{date_key}", SummaryService.refresh_summary, date_key)
+    job_queue.submit(None, notify_task_complete, str(task_id), summary)
     
-    return {"summary_markdown": summary}
\ No newline at end of file
+    return json_response({"summary_markdown": summary, "date_key": date_key}, status_code=202)
\ No newline at end of file
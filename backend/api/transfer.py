@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+
+from services.transfer import MEDIA_TYPES, TransferService
+from serializers import json_response
+
+router = APIRouter()
+
+FORMAT_PATTERN = "^(ndjson|arrow|parquet)$"
+
+@router.get("/export/{entity}")
+async def export_entity(
+    entity: str = Path(..., pattern="^(tasks|steps|achievements)$"),
+    format: str = Query("ndjson", pattern=FORMAT_PATTERN)
+):
+    """流式导出整张表（NDJSON、Arrow IPC 流或 Parquet），按批查询并写出，内存占用与数据量无关"""
+    try:
+        TransferService.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        TransferService.export_stream(entity, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'}
+    )
+
+@router.post("/import/{entity}")
+async def import_entity(
+    request: Request,
+    entity: str = Path(..., pattern="^(tasks|steps)$"),
+    format: str = Query("ndjson", pattern=FORMAT_PATTERN)
+):
+    """流式导入导出格式的任务或步骤（请求体即文件内容），分批在事务中写入，返回导入数量和出错的行"""
+    try:
+        result = await TransferService.import_stream(entity, request.stream(), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response(result)
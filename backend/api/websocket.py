@@ -1,8 +1,30 @@
+import json
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from websocket_manager import manager
+from websocket_manager import manager, task_topic, event_topic
 
 router = APIRouter()
 
+async def handle_client_message(websocket: WebSocket, data: str):
+    """处理订阅消息：{"action": "subscribe"|"unsubscribe", "task_ids": [...], "events": [...]}"""
+    try:
+        message = json.loads(data)
+        action = message.get("action")
+        topics = [task_topic(str(task_id)) for task_id in message.get("task_ids", [])]
+        topics += [event_topic(str(event)) for event in message.get("events", [])]
+    except (ValueError, AttributeError, TypeError):
+        await manager.send_to(websocket, {"type": "error", "detail": "Invalid message"})
+        return
+    
+    if action == "subscribe":
+        subscribed = manager.subscribe(websocket, topics)
+    elif action == "unsubscribe":
+        subscribed = manager.unsubscribe(websocket, topics)
+    else:
+        await manager.send_to(websocket, {"type": "error", "detail": f"Unknown action: {action}"})
+        return
+    
+    await manager.send_to(websocket, {"type": "subscriptions", "topics": sorted(subscribed)})
+
 @router.websocket("/ws/progress")
 async def websocket_endpoint(websocket: WebSocket):
     client_id = str(websocket.client)
@@ -10,7 +32,9 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         while True:
             data = await websocket.receive_text()
-            # Handle incoming messages if needed
-            pass
+            await handle_client_message(websocket, data)
     except WebSocketDisconnect:
+        pass
+    finally:
+        # 慢客户端可能已被服务端主动断开，这里重复调用是安全的
         manager.disconnect(websocket, client_id)
\ No newline at end of file
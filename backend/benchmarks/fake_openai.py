@@ -0,0 +1,61 @@
+import json
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI
+
+import services.agent as agent_module
+
+STEP_TEXTS = [
+    "搜索相关资料，初步了解背景",
+    "写一份详细的方案文档",
+    "编写代码实现核心功能",
+    "测试并验证结果",
+    "整理会议纪要并同步给团队",
+    "安装并配置运行环境",
+]
+
+class FakeCompletionTransport(httpx.AsyncBaseTransport):
+    """模拟 OpenAI chat.completions 接口：固定延迟后返回'第X步：'格式的拆解结果"""
+
+    def __init__(self, latency: float = 0.2, steps: int = len(STEP_TEXTS)):
+        self.latency = latency
+        self.text = "好的，拆解如下：\n" + "".join(
+            f"第{i + 1}步：{STEP_TEXTS[i % len(STEP_TEXTS)]}\n" for i in range(steps)
+        )
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        body = json.loads(request.content or b"{}")
+        if body.get("stream"):
+            chunks = []
+            for i in range(0, len(self.text), 8):
+                chunk = {
+                    "id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                    "choices": [{"index": 0, "delta": {"content": self.text[i:i + 8]}, "finish_reason": None}]
+                }
+                chunks.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            chunks.append("data: [DONE]\n\n")
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content="".join(chunks).encode()
+            )
+        return httpx.Response(200, json={
+            "id": "bench", "object": "chat.completion", "created": 0, "model": "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 120, "total_tokens": 170}
+        })
+
+def install_fake_openai(latency: float) -> FakeCompletionTransport:
+    """替换 AgentService 使用的共享客户端，请求不会离开本进程"""
+    transport = FakeCompletionTransport(latency)
+    agent_module._client = AsyncOpenAI(
+        api_key="benchmark",
+        base_url="http://fake-openai/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=transport)
+    )
+    return transport
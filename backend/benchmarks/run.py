@@ -0,0 +1,314 @@
+"""基准测试入口，在 backend 目录下运行：
+
+    python -m benchmarks.run --steps 100000 --output results.json
+    python -m benchmarks.run --steps 100000 --compare results.json
+
+应用通过 ASGI 传输在进程内调用（不经过网络），OpenAI 接口替换为固定延迟的本地模拟"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# 指标按名称比较，值越小越好的放这里，其余（吞吐量）越大越好
+LOWER_IS_BETTER = ("p50_ms", "p90_ms", "p99_ms", "max_ms", "mean_ms", "errors", "seconds")
+# 运行参数而非测量结果，不参与对比
+NOT_COMPARED = ("requests", "clients", "tasks", "steps", "existing_steps")
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "p50_ms": round(_percentile(values, 50) * 1000, 3),
+        "p90_ms": round(_percentile(values, 90) * 1000, 3),
+        "p99_ms": round(_percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0
+    }
+
+async def measure(
+    call: Callable[[int], Awaitable[bool]],
+    requests: int,
+    concurrency: int
+) -> Dict[str, float]:
+    """以固定并发执行 requests 次调用；call 返回 False 或抛异常计为错误"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+class _BenchSocket:
+    """只实现 ConnectionManager 用到的接口，收到消息时回调"""
+
+    def __init__(self, on_receive: Callable[[str], None]):
+        self.on_receive = on_receive
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.on_receive(text)
+
+    async def close(self, code: int = 1000):
+        pass
+
+async def websocket_fanout(clients: int, messages: int) -> Dict[str, float]:
+    """N 个连接接收广播：每条消息从发布到最后一个连接收到的耗时"""
+    from event_bus import LocalEventBus
+    from websocket_manager import ConnectionManager
+
+    manager = ConnectionManager(bus=LocalEventBus())
+    await manager.start()
+    pending: Dict[str, int] = {}
+    done: Dict[str, asyncio.Event] = {}
+
+    def on_receive(text: str):
+        key = json.loads(text)["n"]
+        pending[key] -= 1
+        if pending[key] == 0:
+            done[key].set()
+
+    sockets = [_BenchSocket(on_receive) for _ in range(clients)]
+    for i, socket in enumerate(sockets):
+        await manager.connect(socket, f"bench-{i}")
+
+    latencies = []
+    started = time.perf_counter()
+    for n in range(messages):
+        key = str(n)
+        pending[key] = clients
+        done[key] = asyncio.Event()
+        sent = time.perf_counter()
+        await manager.broadcast({"type": "bench", "n": key})
+        await done[key].wait()
+        latencies.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - started
+
+    for i, socket in enumerate(sockets):
+        manager.disconnect(socket, f"bench-{i}")
+    await manager.stop()
+
+    result = summarize(latencies, 0, elapsed)
+    result["clients"] = clients
+    result["deliveries_per_second"] = round(clients * messages / elapsed, 1) if elapsed else 0.0
+    return result
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # 应用模块在设置 TASKAGENT_DB_PATH 之后才能导入
+    import httpx
+    from sqlmodel import select
+
+    from main import app
+    from models import Step, Task, async_session
+    from job_queue import job_queue
+    from benchmarks.seed import seed_database
+    from benchmarks.fake_openai import install_fake_openai
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Any] = {}
+
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        seeded = await seed_database(args.steps, seed=args.seed)
+        seeded["seconds"] = round(time.perf_counter() - started, 2)
+        print(f"seeded {seeded}", file=sys.stderr)
+
+        async with async_session() as session:
+            step_ids = [str(step_id) for step_id in (await session.exec(select(Step.id))).all()]
+            open_task_ids = [
+                str(task_id)
+                for task_id in (await session.exec(select(Task.id).where(Task.completed_at == None))).all()
+            ]
+        rng.shuffle(open_task_ids)
+
+        transport = install_fake_openai(args.llm_latency)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+        async def list_tasks(i: int) -> bool:
+            response = await client.get("/api/v1/tasks/", params={"limit": args.page_size})
+            return response.status_code == 200
+
+        async def update_step(i: int) -> bool:
+            response = await client.patch(
+                f"/api/v1/tasks/steps/{rng.choice(step_ids)}",
+                json={"done": rng.random() < 0.5}
+            )
+            return response.status_code == 200
+
+        async def complete_task(i: int) -> bool:
+            if i >= len(open_task_ids):
+                return False
+            response = await client.post(f"/api/v1/tasks/{open_task_ids[i]}/complete")
+            return response.status_code == 202
+
+        async def summary_today(i: int) -> bool:
+            response = await client.get("/api/v1/summary/today")
+            return response.status_code == 200
+
+        search_terms = ["会议纪要", "核心功能", "资料 背景", "配置", "方案文档 团队"]
+
+        async def search_tasks(i: int) -> bool:
+            response = await client.get(
+                "/api/v1/tasks/search",
+                params={"q": search_terms[i % len(search_terms)], "limit": args.page_size}
+            )
+            return response.status_code == 200
+
+        stats_start = (datetime.utcnow() - timedelta(days=364)).strftime("%Y-%m-%d")
+
+        async def stats_year(i: int) -> bool:
+            # 客户端年度热力图：一年按天分桶并带细分
+            response = await client.get("/api/v1/stats/", params={"start": stats_start, "bucket": "day"})
+            return response.status_code == 200
+
+        async def create_ai_task(i: int) -> bool:
+            # 标题各不相同，避免命中拆解缓存
+            response = await client.post("/api/v1/tasks/", json={"title": f"基准 AI 任务 {i}", "use_ai": True})
+            return response.status_code == 200
+
+        scenarios = {
+            "list_tasks": (list_tasks, args.requests),
+            "update_step": (update_step, args.requests),
+            "complete_task": (complete_task, min(args.requests, len(open_task_ids))),
+            "summary_today": (summary_today, args.requests),
+            "search_tasks": (search_tasks, args.requests),
+            "stats_year": (stats_year, args.requests),
+            "create_task_ai": (create_ai_task, args.ai_requests),
+        }
+        only = set(args.only or [*scenarios, "websocket_fanout"])
+        for name, (call, requests) in scenarios.items():
+            if name not in only or requests <= 0:
+                continue
+            results[name] = await measure(call, requests, args.concurrency)
+            print(f"{name}: {results[name]}", file=sys.stderr)
+
+        if "websocket_fanout" in only:
+            results["websocket_fanout"] = await websocket_fanout(args.ws_clients, args.ws_messages)
+            print(f"websocket_fanout: {results['websocket_fanout']}", file=sys.stderr)
+
+        await client.aclose()
+        # 等待完成任务触发的后台作业结束，再关闭应用
+        await job_queue.join()
+
+    results["seed"] = seeded
+    results["llm_requests"] = transport.requests
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 10.0) -> List[str]:
+    """逐项对比两次结果，输出变化百分比；退化超过 threshold% 的指标标记为 !"""
+    lines = []
+    for scenario, metrics in current["results"].items():
+        base = baseline.get("results", {}).get(scenario)
+        if not isinstance(metrics, dict) or not isinstance(base, dict):
+            continue
+        for metric, value in metrics.items():
+            if metric in NOT_COMPARED:
+                continue
+            old = base.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old * 100
+            worse = change > 0 if metric in LOWER_IS_BETTER else change < 0
+            mark = "!" if worse and abs(change) >= threshold else " "
+            lines.append(f"{mark} {scenario:<18} {metric:<22} {old:>12} -> {value:>12} ({change:+.1f}%)")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="TaskAgent backend benchmarks")
+    parser.add_argument("--steps", type=int, default=10000, help="合成数据的步骤数（每个任务9步）")
+    parser.add_argument("--db", help="数据库文件路径；已有数据时不再写入合成数据。默认使用临时文件")
+    parser.add_argument("--requests", type=int, default=500, help="每个接口场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=50, help="列表接口的 limit")
+    parser.add_argument("--ai-requests", type=int, default=50, help="AI 拆解创建任务的请求数")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="模拟 OpenAI 接口的延迟（秒）")
+    parser.add_argument("--ws-clients", type=int, default=1000)
+    parser.add_argument("--ws-messages", type=int, default=200)
+    parser.add_argument("--only", nargs="+", help="只运行指定场景")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的结果对比")
+    parser.add_argument("--threshold", type=float, default=10.0, help="对比时标记退化的变化百分比")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.db:
+        os.environ["TASKAGENT_DB_PATH"] = args.db
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix="taskagent-bench-")
+        os.environ["TASKAGENT_DB_PATH"] = str(Path(temp_dir.name) / "bench.db")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "steps": args.steps,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+        },
+        "results": results
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"\ncompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+        for line in compare(report, baseline, args.threshold):
+            print(line)
+
+if __name__ == "__main__":
+    main()
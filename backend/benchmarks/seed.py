@@ -0,0 +1,85 @@
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+from uuid import uuid4
+
+from sqlalchemy import func, insert
+from sqlmodel import select
+
+from models import Step, Task, async_session
+from services.classifier import step_classifier
+from services.summary import SummaryService
+from benchmarks.fake_openai import STEP_TEXTS
+
+INSERT_CHUNK = 10000
+
+async def seed_database(
+    steps: int,
+    steps_per_task: int = 9,
+    completed_ratio: float = 0.3,
+    days: int = 30,
+    seed: int = 42
+) -> Dict[str, int]:
+    """写入合成数据：约 steps 个步骤，部分任务在最近 days 天内完成，并重算成就"""
+    async with async_session() as session:
+        existing = (await session.exec(select(func.count(Step.id)))).one()
+    if existing:
+        return {"tasks": 0, "steps": 0, "existing_steps": existing}
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    task_count = max(1, steps // steps_per_task)
+    # 同一内容的分类结果相同，预先算好
+    attributes = {text: step_classifier.classify(text, 2) for text in STEP_TEXTS}
+
+    task_rows = []
+    step_rows = []
+    inserted_steps = 0
+
+    async def flush():
+        async with async_session() as session:
+            if task_rows:
+                await session.execute(insert(Task.__table__), task_rows)
+            if step_rows:
+                await session.execute(insert(Step.__table__), step_rows)
+            await session.commit()
+        task_rows.clear()
+        step_rows.clear()
+
+    for i in range(task_count):
+        task_id = uuid4()
+        completed = rng.random() < completed_ratio
+        created_at = now - timedelta(days=rng.uniform(0, days), seconds=i)
+        completed_at = min(now, created_at + timedelta(hours=rng.uniform(1, 48))) if completed else None
+
+        minutes = 0
+        for order_idx in range(steps_per_task):
+            text = rng.choice(STEP_TEXTS)
+            tool, theme, deliverable, estimate = attributes[text]
+            minutes += estimate
+            step_rows.append({
+                "id": uuid4(),
+                "task_id": task_id,
+                "content": text,
+                "tool": tool,
+                "theme": theme,
+                "deliverable": deliverable,
+                "estimate_minutes": estimate,
+                "done": completed or rng.random() < 0.3,
+                "order_idx": order_idx
+            })
+        inserted_steps += steps_per_task
+        task_rows.append({
+            "id": task_id,
+            "title": f"基准任务 {i}",
+            "estimated_minutes": minutes,
+            "created_at": created_at,
+            "completed_at": completed_at
+        })
+        if len(step_rows) >= INSERT_CHUNK:
+            await flush()
+    await flush()
+
+    # 成就计数按任务数据全量重算，与线上增量维护的结果一致
+    await SummaryService.rebuild_achievements()
+    return {"tasks": task_count, "steps": inserted_steps, "existing_steps": 0}
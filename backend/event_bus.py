@@ -0,0 +1,128 @@
+import os
+import json
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+from uuid import uuid4
+
+import structlog
+from sqlalchemy import delete, func, insert
+from sqlmodel import select
+
+from models import BusEvent, async_session
+
+logger = structlog.get_logger()
+
+WS_BUS = os.getenv("TASKAGENT_WS_BUS", "local")  # local / sqlite
+WS_BUS_POLL_INTERVAL = float(os.getenv("TASKAGENT_WS_BUS_POLL_INTERVAL", "0.05"))
+WS_BUS_RETENTION = int(os.getenv("TASKAGENT_WS_BUS_RETENTION", "60"))
+
+# 本地投递回调：(已序列化的消息, 主题列表或None表示广播, 合并键)
+Deliver = Callable[[str, Optional[List[str]], Optional[str]], Awaitable[None]]
+# 待转发的事件：(已序列化的消息, 主题列表或None, 合并键)
+Event = Tuple[str, Optional[List[str]], Optional[str]]
+
+class LocalEventBus:
+    """进程内事件总线：本进程的连接由 ConnectionManager 直接投递，无需转发，适用于单worker部署"""
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def publish(self, text: str, topics: Optional[List[str]] = None, coalesce_key: Optional[str] = None):
+        pass
+
+    async def publish_many(self, events: List[Event]):
+        pass
+
+class SQLiteEventBus(LocalEventBus):
+    """跨进程事件总线：事件写入共享SQLite数据库中的 ws_events 表，各worker轮询投递给自己的连接"""
+
+    def __init__(self, poll_interval: float = WS_BUS_POLL_INTERVAL, retention_seconds: int = WS_BUS_RETENTION):
+        super().__init__()
+        self.origin = uuid4().hex
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.last_id = 0
+        self._poller: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        # 只投递启动之后的事件
+        async with async_session() as session:
+            self.last_id = (await session.exec(select(func.max(BusEvent.id)))).one() or 0
+        self._poller = asyncio.create_task(self._poll_loop())
+        logger.info("SQLite event bus started", origin=self.origin, last_id=self.last_id)
+
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+
+    async def publish(self, text: str, topics: Optional[List[str]] = None, coalesce_key: Optional[str] = None):
+        await self.publish_many([(text, topics, coalesce_key)])
+
+    async def publish_many(self, events: List[Event]):
+        # 本进程的连接已由 ConnectionManager 投递，这里只写入供其他进程轮询；
+        # 批量写入的一组事件在同一个事务中一次插入
+        if not events:
+            return
+        created_at = datetime.utcnow()
+        async with async_session() as session:
+            await session.execute(insert(BusEvent.__table__), [
+                {
+                    "origin": self.origin,
+                    "topics": json.dumps(topics) if topics is not None else None,
+                    "coalesce_key": coalesce_key,
+                    "message": text,
+                    "created_at": created_at
+                }
+                for text, topics, coalesce_key in events
+            ])
+            await session.commit()
+
+    async def _poll_loop(self):
+        polls = 0
+        while True:
+            try:
+                await self._poll_once()
+                polls += 1
+                if polls % max(1, int(self.retention_seconds / self.poll_interval)) == 0:
+                    await self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Event bus poll failed", error=str(e))
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll_once(self):
+        async with async_session() as session:
+            events = (await session.exec(
+                select(BusEvent).where(BusEvent.id > self.last_id).order_by(BusEvent.id)
+            )).all()
+        
+        for event in events:
+            self.last_id = event.id
+            if event.origin == self.origin or not self.deliver:
+                continue
+            topics = json.loads(event.topics) if event.topics is not None else None
+            await self.deliver(event.message, topics, event.coalesce_key)
+
+    async def _prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        async with async_session() as session:
+            await session.execute(delete(BusEvent).where(BusEvent.created_at < cutoff))
+            await session.commit()
+
+def create_event_bus(kind: str = WS_BUS) -> LocalEventBus:
+    if kind == "local":
+        return LocalEventBus()
+    if kind == "sqlite":
+        return SQLiteEventBus()
+    raise ValueError(f"Unknown TASKAGENT_WS_BUS: {kind}")
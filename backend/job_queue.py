@@ -0,0 +1,83 @@
+import os
+import asyncio
+import structlog
+from typing import Any, Awaitable, Callable, Optional, Set, Tuple
+
+from metrics import registry
+
+logger = structlog.get_logger()
+
+JOB_WORKERS = int(os.getenv("TASKAGENT_JOB_WORKERS", "2"))
+
+JOB_FAILURES = registry.counter("taskagent_job_failures_total", "Background jobs that raised")
+
+Job = Tuple[Optional[str], Callable[..., Awaitable[Any]], tuple]
+
+class JobQueue:
+    """进程内异步任务队列：请求返回后由后台worker执行耗时工作"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.worker_count = workers
+        self.queue: Optional["asyncio.Queue[Job]"] = None
+        self._workers: Set[asyncio.Task] = set()
+        # 已入队但尚未开始执行的去重键
+        self._queued_keys: Set[str] = set()
+
+    def start(self):
+        if self._workers:
+            return
+        # 队列绑定到当前事件循环，因此在启动时创建
+        self.queue = asyncio.Queue()
+        self._queued_keys.clear()
+        for i in range(self.worker_count):
+            self._workers.add(asyncio.create_task(self._worker(i)))
+        logger.info("Job queue started", workers=self.worker_count)
+
+    async def stop(self, timeout: float = 10.0):
+        """等待已入队的任务执行完毕后停止worker"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Job queue did not drain before shutdown", pending=self.queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self.queue = None
+
+    async def join(self):
+        if self.queue is not None:
+            await self.queue.join()
+
+    def submit(self, key: Optional[str], func: Callable[..., Awaitable[Any]], *args) -> bool:
+        """提交任务；带key的任务若已在队列中等待则合并，返回是否真正入队"""
+        self.start()
+        if key is not None:
+            if key in self._queued_keys:
+                return False
+            self._queued_keys.add(key)
+        self.queue.put_nowait((key, func, args))
+        return True
+
+    async def _worker(self, worker_id: int):
+        while True:
+            key, func, args = await self.queue.get()
+            # 开始执行后再有同key任务需要重新入队，保证读到最新数据
+            if key is not None:
+                self._queued_keys.discard(key)
+            try:
+                await func(*args)
+            except Exception as e:
+                JOB_FAILURES.inc()
+                logger.error("Background job failed", job=key or func.__name__, error=str(e))
+            finally:
+                self.queue.task_done()
+
+job_queue = JobQueue()
+
+registry.gauge(
+    "taskagent_job_queue_depth", "Background jobs waiting to run",
+    lambda: {(): job_queue.queue.qsize() if job_queue.queue is not None else 0}
+)
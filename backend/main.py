@@ -2,14 +2,19 @@ import os
 import asyncio
 from pathlib import Path
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import structlog
 from contextlib import asynccontextmanager
 
+from metrics import METRICS_ENABLED, PROFILING_ENABLED, MetricsMiddleware, registry
 from models import create_db_and_tables
-from api import tasks, summaries, achievements, websocket
+from migrations import run_migrations
+from job_queue import job_queue
+from websocket_manager import manager
+from api import tasks, summaries, achievements, changes, stats, transfer, websocket
 from services.task import TaskService
-from services.agent import AgentService
+from services.agent import AgentService, close_openai_client
 from services.summary import SummaryService
 
 logger = structlog.get_logger()
@@ -17,8 +22,14 @@ logger = structlog.get_logger()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_db_and_tables()
-    logger.info("Database initialized")
+    schema_version = await run_migrations()
+    logger.info("Database initialized", schema_version=schema_version)
+    job_queue.start()
+    await manager.start()
     yield
+    await job_queue.stop()
+    await manager.stop()
+    await close_openai_client()
 
 app = FastAPI(
     title="TaskAgent API",
@@ -34,9 +45,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED or PROFILING_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(tasks.router, prefix="/api/v1/tasks", tags=["tasks"])
 app.include_router(summaries.router, prefix="/api/v1", tags=["summaries"])
 app.include_router(achievements.router, prefix="/api/v1/achievements", tags=["achievements"])
+app.include_router(changes.router, prefix="/api/v1/changes", tags=["changes"])
+app.include_router(stats.router, prefix="/api/v1/stats", tags=["stats"])
+app.include_router(transfer.router, prefix="/api/v1", tags=["transfer"])
 app.include_router(websocket.router, prefix="/ws")
 
 @app.get("/api/v1/tools")
@@ -44,6 +61,16 @@ async def get_tools():
     from services.agent import TOOL_DEFS
     return TOOL_DEFS
 
+@app.get("/api/v1/cache/stats")
+async def get_cache_stats():
+    from services.cache import decomposition_cache
+    return decomposition_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
@@ -0,0 +1,77 @@
+import asyncio
+import argparse
+
+from models import create_db_and_tables
+from migrations import run_migrations
+from services.summary import SummaryService
+from services.backfill import BACKFILL_BATCH_SIZE, BackfillService
+from services.classifier import ATTRIBUTES, StepClassifier, step_classifier
+from services.search import SearchService
+
+async def rebuild_achievements(args):
+    result = await SummaryService.rebuild_achievements(args.date)
+    print(f"Rebuilt {result['days']} day(s), {len(result['drifted'])} drifted")
+    for date_key in result["drifted"]:
+        print(f"  {date_key}")
+
+async def reclassify_steps(args):
+    classifier = StepClassifier.from_file(args.rules) if args.rules else step_classifier
+    fields = [f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else ATTRIBUTES
+    
+    def progress(stats):
+        print(f"  {stats['tasks']} task(s), {stats['steps']} step(s) scanned", flush=True)
+    
+    stats = await BackfillService.reclassify_steps(
+        batch_size=args.batch_size,
+        fields=fields,
+        classifier=classifier,
+        restart=args.restart,
+        dry_run=args.dry_run,
+        progress=progress
+    )
+    action = "Would change" if args.dry_run else "Changed"
+    print(f"{action} {stats['changed_steps']} step(s) and {stats['changed_tasks']} task estimate(s)")
+
+async def rebuild_search_index(args):
+    await SearchService.rebuild_index()
+    print("Rebuilt search index")
+
+def main():
+    parser = argparse.ArgumentParser(description="TaskAgent 维护命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild = subparsers.add_parser(
+        "rebuild-achievements",
+        help="按任务和步骤数据重算成就计数，修复增量计数的漂移"
+    )
+    rebuild.add_argument("--date", help="只重算指定日期 (YYYY-MM-DD)")
+    rebuild.set_defaults(handler=rebuild_achievements)
+    
+    reclassify = subparsers.add_parser(
+        "reclassify-steps",
+        help="按当前规则重新分配已有步骤的工具/主题/交付物/预估时间，并重算任务总时间（可中断后继续）"
+    )
+    reclassify.add_argument("--rules", help="使用指定的规则文件（默认与服务相同）")
+    reclassify.add_argument("--fields", help=f"只更新这些字段，逗号分隔（{','.join(ATTRIBUTES)}）")
+    reclassify.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="每批处理的任务数")
+    reclassify.add_argument("--restart", action="store_true", help="忽略上次中断的进度，从头开始")
+    reclassify.add_argument("--dry-run", action="store_true", help="只统计会变化的记录，不写入")
+    reclassify.set_defaults(handler=reclassify_steps)
+    
+    search = subparsers.add_parser(
+        "rebuild-search-index",
+        help="按任务和步骤数据重建全文搜索索引"
+    )
+    search.set_defaults(handler=rebuild_search_index)
+    
+    args = parser.parse_args()
+    
+    async def run():
+        await create_db_and_tables()
+        await run_migrations()
+        await args.handler(args)
+    
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import os
+import time
+import random
+import tempfile
+import cProfile
+import contextvars
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # 可选依赖，未安装时退回 cProfile
+    Profiler = None
+
+logger = structlog.get_logger()
+
+METRICS_ENABLED = os.getenv("TASKAGENT_METRICS", "1") != "0"
+# 超过阈值的请求和SQL语句记录警告日志
+SLOW_REQUEST_MS = float(os.getenv("TASKAGENT_SLOW_REQUEST_MS", "1000"))
+SLOW_QUERY_MS = float(os.getenv("TASKAGENT_SLOW_QUERY_MS", "200"))
+# 请求级性能剖析默认关闭；开启后带 X-Profile: 1 头的请求会被剖析，另可按比例随机采样
+PROFILING_ENABLED = os.getenv("TASKAGENT_PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("TASKAGENT_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("TASKAGENT_PROFILE_DIR", str(Path(tempfile.gettempdir()) / "taskagent-profiles")))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """取值在抓取时由 collect 回调计算，返回 标签值元组 -> 数值"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], collect: Callable[[], Dict[Labels, float]]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各桶计数（不累计）..., 总和, 次数]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 3)
+        # 落在 (上一个上界, 上界] 内；超过所有上界的计入 +Inf 桶
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_text} {int(series[-1])}")
+        return lines
+
+class MetricsRegistry:
+    """进程内指标注册表，以 Prometheus 文本格式输出。
+    多 worker 部署时每个进程各自统计，由 Prometheus 按实例分别抓取"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], Dict[Labels, float]],
+        labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self._register(Gauge(name, help, labelnames, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error("Failed to collect metric", metric=metric.name, error=str(e))
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "taskagent_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "taskagent_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+HTTP_DB_QUERIES = registry.histogram(
+    "taskagent_http_request_db_queries", "SQL statements executed per HTTP request", ("method", "route"), COUNT_BUCKETS
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "taskagent_db_query_duration_seconds", "SQL statement latency by statement type", ("operation",), QUERY_BUCKETS
+)
+DB_QUERY_ERRORS = registry.counter(
+    "taskagent_db_query_errors_total", "SQL statements that raised by statement type", ("operation",)
+)
+
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+# 当前请求的统计；后台任务和启动阶段的查询没有对应请求
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+_OPERATIONS = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK"))
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip()[:8].split(None, 1)
+    keyword = keyword[0].upper() if keyword else ""
+    return keyword if keyword in _OPERATIONS else "OTHER"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_LATENCY.observe(elapsed, _operation(statement))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query", duration_ms=round(elapsed * 1000, 1), statement=statement[:500], executemany=executemany)
+
+def _handle_error(context):
+    # 执行失败时不会触发 after_cursor_execute，在这里弹出开始时间，
+    # 否则连接归还连接池后栈中会残留失败语句的时间，之后的耗时全部错位
+    # 栈中只有正在执行的语句，提交失败等非语句错误时为空
+    if context.connection is None:
+        return
+    started = context.connection.info.get("query_started")
+    if started:
+        started.pop()
+        DB_QUERY_ERRORS.inc(_operation(context.statement or ""))
+
+def instrument_engine(engine: Engine):
+    """统计引擎执行的每条SQL（异步引擎传入 engine.sync_engine）"""
+    if not METRICS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+# 同一线程上只能有一个剖析器在运行，剖析期间到达的其他请求不再剖析
+_profiling = False
+
+class _RequestProfiler:
+    """单个请求的性能剖析：优先使用 pyinstrument 的采样剖析（只跟踪当前请求的协程），
+    未安装时用 cProfile（确定性剖析，会混入同时运行的其他协程）"""
+
+    def __init__(self, method: str, path: str):
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{method}-{path.strip('/').replace('/', '_') or 'root'}"
+        if Profiler is not None:
+            self.profiler = Profiler(async_mode="enabled")
+            self.path = PROFILE_DIR / f"{name}.html"
+        else:
+            self.profiler = cProfile.Profile()
+            self.path = PROFILE_DIR / f"{name}.prof"
+
+    def start(self):
+        global _profiling
+        _profiling = True
+        if Profiler is not None:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        global _profiling
+        _profiling = False
+        if Profiler is not None:
+            self.profiler.stop()
+            self.path.write_text(self.profiler.output_html(), encoding="utf-8")
+        else:
+            self.profiler.disable()
+            self.profiler.dump_stats(str(self.path))
+
+def _wants_profile(scope) -> bool:
+    if not PROFILING_ENABLED or _profiling:
+        return False
+    if (b"x-profile", b"1") in scope.get("headers", ()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+class MetricsMiddleware:
+    """记录每个请求的耗时、状态码和SQL语句数，按路由模板（而非实际路径）聚合"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        profiler = _RequestProfiler(scope["method"], scope["path"]) if _wants_profile(scope) else None
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profiler is not None:
+                    message["headers"] = [*message.get("headers", ()), (b"x-profile-file", str(profiler.path).encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                profiler.stop()
+            _request_stats.reset(token)
+            # 路由匹配后 FastAPI 会把路由对象写入 scope；未匹配的路径统一归为一类，避免标签无限增长
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_LATENCY.observe(elapsed, method, route)
+            HTTP_DB_QUERIES.observe(stats.db_queries, method, route)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request",
+                    method=method,
+                    route=route,
+                    status=status,
+                    duration_ms=round(elapsed * 1000, 1),
+                    db_queries=stats.db_queries,
+                    db_ms=round(stats.db_seconds * 1000, 1)
+                )
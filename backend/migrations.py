@@ -0,0 +1,142 @@
+from typing import Awaitable, Callable, List, Tuple, Union
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from models import BusEvent, async_engine
+from services.search import SEARCH_INDEX_STATEMENTS
+
+logger = structlog.get_logger()
+
+async def _add_column(conn: AsyncConnection, table: str, column: str, ddl: str):
+    """SQLite 的 ADD COLUMN 不支持 IF NOT EXISTS，先检查列是否已存在"""
+    columns = [row[1] for row in (await conn.execute(text(f"PRAGMA table_info({table})"))).all()]
+    if column not in columns:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+async def _recreate_bus_table(conn: AsyncConnection):
+    """ws_events 只保存短时间内的跨进程事件，直接按当前定义重建为 AUTOINCREMENT 表"""
+    ddl = (await conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'ws_events'"))).scalar()
+    if ddl and "AUTOINCREMENT" in ddl.upper():
+        return
+    await conn.execute(text("DROP TABLE IF EXISTS ws_events"))
+    await conn.run_sync(lambda sync_conn: BusEvent.__table__.create(sync_conn))
+
+MigrationStep = Union[str, Callable[[AsyncConnection], Awaitable[None]]]
+
+# create_all 只会创建缺失的表，不会修改已有数据库，结构变更在这里按版本追加。
+# 当前版本记录在 PRAGMA user_version 中；新库的表和索引已由 create_all 创建，
+# 所以语句必须是幂等的（IF NOT EXISTS，或用函数先检查再修改）。
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (
+        1,
+        "add indexes for hot task/step queries",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_steps_task_id_order_idx ON steps (task_id, order_idx)",
+            "CREATE INDEX IF NOT EXISTS ix_tasks_completed_at ON tasks (completed_at)",
+            "CREATE INDEX IF NOT EXISTS ix_tasks_open_created_at ON tasks (created_at, id) "
+            "WHERE completed_at IS NULL",
+        ],
+    ),
+    (
+        2,
+        "version stamps for materialised daily summaries",
+        [
+            # 已有的总结全部视为过期，下次读取时重新生成
+            lambda conn: _add_column(conn, "achievements", "summary_version", "INTEGER NOT NULL DEFAULT 1"),
+            lambda conn: _add_column(conn, "achievements", "rendered_version", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+    ),
+    (
+        3,
+        "full-text search index over task titles and step content",
+        [
+            # 外部内容索引：文本仍只存于 tasks/steps 表，索引按 rowid 对应，写入一个步骤只需索引这一行。
+            # trigram 分词不依赖空格，中文可按任意连续三个字检索
+            "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+            "title, id UNINDEXED, content='tasks', content_rowid='rowid', tokenize='trigram')",
+            "CREATE VIRTUAL TABLE IF NOT EXISTS step_search USING fts5("
+            "content, task_id UNINDEXED, content='steps', content_rowid='rowid', tokenize='trigram')",
+            "CREATE TRIGGER IF NOT EXISTS task_search_insert AFTER INSERT ON tasks BEGIN "
+            "INSERT INTO task_search (rowid, title, id) VALUES (new.rowid, new.title, new.id); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS task_search_update AFTER UPDATE OF title ON tasks "
+            "WHEN old.title IS NOT new.title BEGIN "
+            "INSERT INTO task_search (task_search, rowid, title, id) VALUES ('delete', old.rowid, old.title, old.id); "
+            "INSERT INTO task_search (rowid, title, id) VALUES (new.rowid, new.title, new.id); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS task_search_delete AFTER DELETE ON tasks BEGIN "
+            "INSERT INTO task_search (task_search, rowid, title, id) VALUES ('delete', old.rowid, old.title, old.id); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS step_search_insert AFTER INSERT ON steps BEGIN "
+            "INSERT INTO step_search (rowid, content, task_id) VALUES (new.rowid, new.content, new.task_id); "
+            "END",
+            # 批量更新步骤时 content 总在 SET 中，内容没变就不重建索引
+            "CREATE TRIGGER IF NOT EXISTS step_search_update AFTER UPDATE OF content ON steps "
+            "WHEN old.content IS NOT new.content BEGIN "
+            "INSERT INTO step_search (step_search, rowid, content, task_id) "
+            "VALUES ('delete', old.rowid, old.content, old.task_id); "
+            "INSERT INTO step_search (rowid, content, task_id) VALUES (new.rowid, new.content, new.task_id); "
+            "END",
+            "CREATE TRIGGER IF NOT EXISTS step_search_delete AFTER DELETE ON steps BEGIN "
+            "INSERT INTO step_search (step_search, rowid, content, task_id) "
+            "VALUES ('delete', old.rowid, old.content, old.task_id); "
+            "END",
+            # 为已有数据建立索引（rebuild 按内容表重建，可重复执行）
+            "INSERT INTO task_search (task_search) VALUES ('rebuild')",
+            "INSERT INTO step_search (step_search) VALUES ('rebuild')",
+        ],
+    ),
+    (
+        4,
+        "version stamps for daily theme/tool rollups",
+        [
+            # daily_stats 表由 create_all 创建；已有日期的细分全部视为过期，首次查询统计时生成
+            lambda conn: _add_column(conn, "achievements", "stats_version", "INTEGER NOT NULL DEFAULT 0"),
+        ],
+    ),
+    (
+        5,
+        "restrict the completed_at index to completed tasks",
+        [
+            # 重建为部分索引后，未完成任务列表改走 ix_tasks_open_created_at，不再对全部未完成任务排序
+            "DROP INDEX IF EXISTS ix_tasks_completed_at",
+            "CREATE INDEX ix_tasks_completed_at ON tasks (completed_at) WHERE completed_at IS NOT NULL",
+        ],
+    ),
+    (
+        6,
+        "monotonic ids for cross-process websocket events",
+        [_recreate_bus_table],
+    ),
+    (
+        7,
+        "key the search index on stable ids and index two-character fragments",
+        # tasks/steps 以UUID为主键，隐式 rowid 在 VACUUM 后可能重新编号，按当前定义整体重建
+        SEARCH_INDEX_STATEMENTS,
+    ),
+]
+
+async def run_migrations() -> int:
+    """执行所有未应用的迁移，返回迁移后的版本号"""
+    async with async_engine.begin() as conn:
+        current = (await conn.execute(text("PRAGMA user_version"))).scalar() or 0
+        applied = False
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    await statement(conn)
+                else:
+                    await conn.execute(text(statement))
+            # PRAGMA 不支持参数绑定，版本号来自上面的常量
+            await conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+            current = version
+            applied = True
+            logger.info("Applied migration", version=version, description=description)
+        if applied:
+            # 让查询规划器拿到新索引的统计信息
+            await conn.execute(text("ANALYZE"))
+    return current
@@ -2,10 +2,20 @@ from datetime import datetime
 from typing import List, Optional
 from uuid import UUID, uuid4
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Index, text
 
 class Task(SQLModel, table=True):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # 只索引已完成的任务（按天统计的范围扫描）；若包含 NULL，规划器会用它做
+        # completed_at IS NULL 的等值查找，而不用下面按创建时间排序的部分索引
+        Index("ix_tasks_completed_at", "completed_at", sqlite_where=text("completed_at IS NOT NULL")),
+        # 未完成任务列表按 (created_at, id) 倒序分页，使用部分索引
+        Index(
+            "ix_tasks_open_created_at", "created_at", "id",
+            sqlite_where=text("completed_at IS NULL")
+        ),
+    )
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     title: str = Field(max_length=255)
@@ -13,10 +23,16 @@ class Task(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = Field(default=None)
     
-    steps: List["Step"] = Relationship(back_populates="task")
+    steps: List["Step"] = Relationship(
+        back_populates="task",
+        sa_relationship_kwargs={"order_by": "Step.order_idx"}
+    )
 
 class Step(SQLModel, table=True):
     __tablename__ = "steps"
+    __table_args__ = (
+        Index("ix_steps_task_id_order_idx", "task_id", "order_idx"),
+    )
     
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     task_id: UUID = Field(foreign_key="tasks.id")
@@ -39,19 +55,136 @@ class Achievement(SQLModel, table=True):
     step_count: int = Field(default=0)
     consumed_minutes: int = Field(default=0)
     summary_md: str = Field(default="")
+    # 当天数据每次变更都会递增 summary_version；两者不相等说明 summary_md 需要重新生成
+    summary_version: int = Field(default=1)
+    rendered_version: int = Field(default=0)
+    # 与 summary_version 不相等说明当天的 daily_stats 细分需要重算
+    stats_version: int = Field(default=0)
 
-from sqlmodel import create_engine
+class DailyStat(SQLModel, table=True):
+    """按天汇总的已完成步骤细分（当天完成的任务中已完成的步骤，按主题/工具分组）"""
+    __tablename__ = "daily_stats"
+    
+    date_key: str = Field(max_length=10, primary_key=True)  # YYYY-MM-DD
+    dimension: str = Field(max_length=16, primary_key=True)  # theme / tool
+    # 未设置主题/工具的步骤记为空字符串
+    value: str = Field(max_length=100, primary_key=True)
+    step_count: int = Field(default=0)
+    minutes: int = Field(default=0)
+
+class ChangeEvent(SQLModel, table=True):
+    __tablename__ = "changes"
+    # AUTOINCREMENT 保证序号单调递增，清理旧记录后也不会复用
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    entity: str = Field(max_length=16)  # task / step
+    op: str = Field(max_length=16)  # created / updated / completed
+    task_id: str = Field(max_length=36)
+    entity_id: str = Field(max_length=36)
+    data: str  # JSON，只包含变化的字段
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BusEvent(SQLModel, table=True):
+    __tablename__ = "ws_events"
+    # 清理会删掉全部旧事件，没有 AUTOINCREMENT 时 id 会从1重新开始，
+    # 其他worker记录的 last_id 仍是旧值，之后的事件会被跳过
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    origin: str = Field(max_length=32)  # 发布事件的进程，避免本进程重复投递
+    topics: Optional[str] = Field(default=None)  # JSON数组，NULL表示广播
+    coalesce_key: Optional[str] = Field(default=None, max_length=255)
+    message: str
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class BackfillCheckpoint(SQLModel, table=True):
+    __tablename__ = "backfill_checkpoints"
+    
+    name: str = Field(primary_key=True, max_length=64)
+    cursor: Optional[str] = Field(default=None, max_length=64)  # 最后处理完的键，NULL表示从头开始
+    processed: int = Field(default=0)
+    changed: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class DecompositionCache(SQLModel, table=True):
+    __tablename__ = "decomposition_cache"
+    
+    key: str = Field(primary_key=True, max_length=64)  # sha256(max_steps + 规范化提示词)
+    steps_json: str
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+import os
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, StaticPool
 from pathlib import Path
 
+from metrics import instrument_engine
+
 DATABASE_URL = "sqlite:///~/Library/Application Support/TaskAgent/task.db"
 
-def get_engine():
+# SQLite 连接参数，均可通过环境变量覆盖
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("TASKAGENT_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("TASKAGENT_SQLITE_SYNCHRONOUS", "NORMAL"),
+    # 负数单位为 KiB，默认 64 MiB 页缓存
+    "cache_size": int(os.getenv("TASKAGENT_SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("TASKAGENT_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("TASKAGENT_SQLITE_BUSY_TIMEOUT", "5000")),
+    "temp_store": os.getenv("TASKAGENT_SQLITE_TEMP_STORE", "MEMORY"),
+}
+SQLITE_POOL = os.getenv("TASKAGENT_SQLITE_POOL", "queue")  # queue / static / null
+SQLITE_POOL_SIZE = int(os.getenv("TASKAGENT_SQLITE_POOL_SIZE", "5"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("TASKAGENT_SQLITE_MAX_OVERFLOW", "10"))
+
+def get_db_file() -> Path:
+    override = os.getenv("TASKAGENT_DB_PATH")
+    if override:
+        db_file = Path(override).expanduser()
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        return db_file
+    
     db_path = Path.home() / "Library/Application Support/TaskAgent"
     db_path.mkdir(parents=True, exist_ok=True)
-    db_file = db_path / "task.db"
-    return create_engine(f"sqlite:///{db_file}")
+    return db_path / "task.db"
+
+def _pool_options() -> dict:
+    if SQLITE_POOL == "static":
+        return {"poolclass": StaticPool}
+    if SQLITE_POOL == "null":
+        return {"poolclass": NullPool}
+    if SQLITE_POOL != "queue":
+        raise ValueError(f"Unknown TASKAGENT_SQLITE_POOL: {SQLITE_POOL}")
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": SQLITE_POOL_SIZE,
+        "max_overflow": SQLITE_MAX_OVERFLOW
+    }
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    """每个新连接建立时应用 SQLite 调优参数"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def get_async_engine():
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{get_db_file()}",
+        **_pool_options()
+    )
+    event.listen(engine.sync_engine, "connect", _apply_pragmas)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+async_engine = get_async_engine()
 
-engine = get_engine()
+def async_session() -> AsyncSession:
+    """创建异步会话（提交后不过期，便于在会话关闭后读取属性）"""
+    return AsyncSession(async_engine, expire_on_commit=False)
 
 async def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    async with async_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
\ No newline at end of file
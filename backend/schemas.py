@@ -1,7 +1,10 @@
 from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+# 单次批量请求的最大条目数
+BATCH_MAX_ITEMS = 500
 
 class StepCreate(BaseModel):
     content: str
@@ -25,6 +28,7 @@ class StepResponse(BaseModel):
 class TaskCreate(BaseModel):
     title: str
     use_ai: bool = False
+    stream: bool = False
     max_steps: int = 9
     prompt: Optional[str] = None
     tools: Optional[List[str]] = None
@@ -39,6 +43,24 @@ class TaskResponse(BaseModel):
     completed_at: Optional[datetime] = None
     steps: List[StepResponse] = []
 
+class TaskListItem(TaskResponse):
+    step_count: int = 0
+    done_count: int = 0
+
+class TaskSearchHit(BaseModel):
+    id: UUID
+    title: str
+    estimated_minutes: int
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    step_count: int = 0
+    done_count: int = 0
+    # bm25 相关度，越小越相关；只有少于三个字的查询词时为0
+    score: float
+    # HTML 转义后用 <mark></mark> 标出命中部分；没有命中时为 None，snippet 取自命中最多的步骤
+    title_highlight: Optional[str] = None
+    snippet: Optional[str] = None
+
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
 
@@ -46,6 +68,43 @@ class StepUpdate(BaseModel):
     done: Optional[bool] = None
     content: Optional[str] = None
 
+class StepBatchItem(StepUpdate):
+    id: UUID
+
+class StepBatchUpdate(BaseModel):
+    updates: List[StepBatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class TaskBatchItem(BaseModel):
+    id: Optional[UUID] = None  # 客户端生成的ID，重复同步时不会重复创建
+    title: str
+    steps: List[StepCreate] = []
+    # 未提供步骤且 use_ai 为真时由AI拆解，参数与 TaskCreate 相同
+    use_ai: bool = False
+    max_steps: int = 9
+    prompt: Optional[str] = None
+    tools: Optional[List[str]] = None
+    context: Optional[str] = None
+    constraints: Optional[str] = None
+
+class TaskBatchCreate(BaseModel):
+    tasks: List[TaskBatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    # AI拆解失败时使用备用步骤创建，否则该项报告为 failed 且不创建
+    fallback: bool = False
+
+class TaskImport(BaseModel):
+    """导入的任务行，字段与导出的 tasks 相同"""
+    id: UUID
+    title: str = Field(..., max_length=255)
+    estimated_minutes: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+
+class StepImport(StepCreate):
+    """导入的步骤行，字段与导出的 steps 相同"""
+    id: UUID
+    task_id: UUID
+    done: bool = False
+
 class SummaryResponse(BaseModel):
     summary_markdown: str
 
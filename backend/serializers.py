@@ -0,0 +1,54 @@
+from typing import Any, Iterable, Mapping, Optional
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from models import Step, Task
+from schemas import StepResponse, TaskListItem, TaskResponse
+
+def step_response(step: Step) -> StepResponse:
+    return StepResponse.model_validate(step, from_attributes=True)
+
+def task_response(task: Task, steps: Iterable[Step] = ()) -> TaskResponse:
+    """Task 行转为 TaskResponse；步骤需由调用方传入（例如已预加载的 task.steps）"""
+    return TaskResponse(
+        id=task.id,
+        title=task.title,
+        estimated_minutes=task.estimated_minutes,
+        created_at=task.created_at,
+        completed_at=task.completed_at,
+        steps=[step_response(step) for step in steps]
+    )
+
+def task_list_item(task: Task, steps: Iterable[Step] = (), step_count: int = 0, done_count: int = 0) -> TaskListItem:
+    return TaskListItem(
+        id=task.id,
+        title=task.title,
+        estimated_minutes=task.estimated_minutes,
+        created_at=task.created_at,
+        completed_at=task.completed_at,
+        steps=[step_response(step) for step in steps],
+        step_count=step_count,
+        done_count=done_count
+    )
+
+def _default(obj: Any) -> Any:
+    # orjson 原生支持 UUID 和 datetime，只需展开 pydantic 模型
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+class JSONResponse(Response):
+    """用 orjson 直接序列化（包括 pydantic 模型），不经过 jsonable_encoder"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> JSONResponse:
+    # 直接返回 Response 时 FastAPI 不会再做一次校验和编码
+    return JSONResponse(content, status_code=status_code, headers=headers)
@@ -1,11 +1,19 @@
 import os
 import json
-from typing import List, Dict, Any
-from openai import OpenAI
+import time
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Union
+import httpx
+from openai import AsyncOpenAI
 import structlog
 
-from models import Task, Step, engine
-from sqlmodel import Session, select
+from metrics import registry
+from models import Task, Step, async_session
+from services.cache import decomposition_cache
+from services.classifier import StepAttributes, step_classifier
+from sqlmodel import select
+from sqlalchemy.orm import selectinload
 
 logger = structlog.get_logger()
 
@@ -70,111 +78,278 @@ TOOL_DEFS = [
     }
 ]
 
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+# 同时进行的模型请求数，以及每秒最多发起的请求数（0表示不限速）
+LLM_CONCURRENCY = int(os.getenv("TASKAGENT_LLM_CONCURRENCY", "8"))
+LLM_RATE_LIMIT = float(os.getenv("TASKAGENT_LLM_RATE_LIMIT", "0"))
+# 超过阈值的模型请求记录警告日志
+SLOW_LLM_MS = float(os.getenv("TASKAGENT_SLOW_LLM_MS", "10000"))
+
+LLM_QUEUE_WAIT = registry.histogram(
+    "taskagent_llm_queue_wait_seconds", "Time spent waiting for an LLM concurrency/rate slot"
+)
+LLM_LATENCY = registry.histogram(
+    "taskagent_llm_request_duration_seconds", "LLM request latency (streams: until the last token)", ("operation", "outcome")
+)
+LLM_FIRST_TOKEN = registry.histogram(
+    "taskagent_llm_time_to_first_token_seconds", "Time until the first streamed token", ("operation",)
+)
+LLM_TOKENS = registry.counter(
+    "taskagent_llm_tokens_total", "Token usage reported by the API (streamed responses report none)", ("operation", "kind")
+)
+
+def _record_llm(operation: str, task_title: str, elapsed: float, outcome: str):
+    LLM_LATENCY.observe(elapsed, operation, outcome)
+    if elapsed * 1000 >= SLOW_LLM_MS:
+        logger.warning(
+            "Slow LLM request",
+            operation=operation,
+            task_title=task_title,
+            outcome=outcome,
+            duration_ms=round(elapsed * 1000, 1)
+        )
+
+@contextmanager
+def _observe_llm(operation: str, task_title: str):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        _record_llm(operation, task_title, time.perf_counter() - started, outcome)
+
+class LLMLimiter:
+    """限制模型请求的并发数，并按固定间隔放行请求"""
+
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, rate: float = LLM_RATE_LIMIT):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+
+    async def _pace(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        # 预约下一个放行时间点，之间没有await，所以不需要加锁
+        start_at = max(now, self._next_at)
+        self._next_at = start_at + self.interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    @asynccontextmanager
+    async def slot(self):
+        started = time.perf_counter()
+        async with self.semaphore:
+            await self._pace()
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - started)
+            yield
+
+llm_limiter = LLMLimiter()
+
+_client: Optional[AsyncOpenAI] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    """进程内共享的 OpenAI 客户端，复用同一个 HTTP 连接池"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=5.0),
+            # SDK 内置指数退避重试（连接错误、429、5xx）
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                )
+            )
+        )
+    return _client
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
 class AgentService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_openai_client()
+
+    def _build_messages(self, task_title: str, max_steps: int) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": "你是一个专业的任务管理专家。请根据用户提供的任务描述，智能地拆解成具体的、可执行的步骤。请用中文回复，每个步骤以'第X步：'开头，然后描述具体内容。步骤要具体、明确、可执行。"
+                f"步骤数量不超过{max_steps}个。"
+            },
+            {
+                "role": "user",
+                "content": f"请帮我拆解这个任务：{task_title}"
+            }
+        ]
+
+    def _step_content(self, line: str) -> Optional[str]:
+        """提取'第X步：'格式行中的步骤内容，非步骤行返回None"""
+        line = line.strip()
+        if not (line.startswith('第') and '步：' in line):
+            return None
+        return line.split('步：', 1)[1].strip()
+
+    def _build_step(self, content: str, attributes: StepAttributes) -> Dict[str, Any]:
+        return {
+            "content": content,
+            "tool": attributes.tool,
+            "theme": attributes.theme,
+            "deliverable": attributes.deliverable,
+            "estimate_minutes": attributes.estimate_minutes
+        }
+
+    def _classify_steps(self, contents: List[str]) -> List[Dict[str, Any]]:
+        """按当前规则一次批量分类步骤内容"""
+        attributes = step_classifier.classify_many([(content, i + 1) for i, content in enumerate(contents)])
+        return [self._build_step(content, attrs) for content, attrs in zip(contents, attributes)]
 
-    def suggest_steps(self, task_title: str) -> List[Dict[str, Any]]:
+    def _parse_step_line(self, line: str, step_num: int) -> Optional[Dict[str, Any]]:
+        """解析单行步骤，并根据步骤内容分配工具、主题、交付物和时间"""
+        content = self._step_content(line)
+        if content is None:
+            return None
+        return self._build_step(content, step_classifier.classify(content, step_num))
+
+    async def _request_steps(self, task_title: str, max_steps: int = 9) -> List[Dict[str, Any]]:
+        """请求模型拆解步骤；请求失败或没有解析出步骤时抛出异常，不使用备用方案"""
+        cached = await decomposition_cache.get(task_title, max_steps)
+        if cached:
+            return self._classify_steps(cached)
+        
+        async with llm_limiter.slot():
+            with _observe_llm("decompose", task_title):
+                response = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=self._build_messages(task_title, max_steps),
+                    temperature=0.7,
+                    max_tokens=1000
+                )
+        if response.usage:
+            LLM_TOKENS.inc("decompose", "prompt", amount=response.usage.prompt_tokens)
+            LLM_TOKENS.inc("decompose", "completion", amount=response.usage.completion_tokens)
+        
+        # 解析GPT返回的实际步骤，所有步骤一次批量分类
+        ai_response = response.choices[0].message.content or ""
+        contents = [
+            content
+            for content in (self._step_content(line) for line in ai_response.strip().split('\n'))
+            if content is not None
+        ][:max_steps]
+        if not contents:
+            raise ValueError("No steps found in model response")
+        
+        await decomposition_cache.put(task_title, max_steps, contents)
+        return self._classify_steps(contents)
+
+    async def suggest_steps(self, task_title: str, max_steps: int = 9) -> List[Dict[str, Any]]:
         """使用GPT-4o-mini生成智能任务拆解步骤"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的任务管理专家。请根据用户提供的任务描述，智能地拆解成具体的、可执行的步骤。请用中文回复，每个步骤以'第X步：'开头，然后描述具体内容。步骤要具体、明确、可执行。"
-                    },
-                    {
-                        "role": "user",
-                        "content": f"请帮我拆解这个任务：{task_title}"
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            # 解析GPT返回的实际步骤
-            ai_response = response.choices[0].message.content
-            
-            # 解析步骤内容
-            steps = []
-            lines = ai_response.strip().split('\n')
-            
-            step_count = 0
-            for line in lines:
-                line = line.strip()
-                if line.startswith('第') and '步：' in line:
-                    step_count += 1
-                    content = line.split('步：', 1)[1].strip()
-                    
-                    # 根据步骤内容智能分配工具和主题
-                    tool, theme, deliverable, estimate = self._intelligent_assignment(content, step_count)
-                    
-                    steps.append({
-                        "content": content,
-                        "tool": tool,
-                        "theme": theme,
-                        "deliverable": deliverable,
-                        "estimate_minutes": estimate
-                    })
-            
-            # 如果GPT没有返回步骤，使用备用方案
-            if not steps:
-                steps = self._fallback_steps(task_title)
-            
-            return steps
-            
+            return await self._request_steps(task_title, max_steps)
         except Exception as e:
+            # 失败时使用备用方案（备用结果不缓存）
             logger.error("Error generating steps", error=str(e))
             return self._fallback_steps(task_title)
-    
-    def _intelligent_assignment(self, content: str, step_num: int) -> tuple:
-        """根据步骤内容智能分配工具、主题、交付物和时间"""
-        content_lower = content.lower()
-        
-        # 工具匹配
-        if any(word in content_lower for word in ['搜索', '查', '找', '调研', '了解']):
-            tool = "浏览器/搜索引擎"
-        elif any(word in content_lower for word in ['写', '文档', '报告', '记录']):
-            tool = "文本编辑器"
-        elif any(word in content_lower for word in ['代码', '编程', '开发', '实现']):
-            tool = "IDE/代码编辑器"
-        elif any(word in content_lower for word in ['测试', '验证', '检查']):
-            tool = "测试工具"
-        elif any(word in content_lower for word in ['安装', '配置', '设置']):
-            tool = "系统工具"
-        else:
-            tool = "手动执行"
-        
-        # 主题匹配
-        if step_num == 1:
-            theme = "规划"
-        elif any(word in content_lower for word in ['搜索', '查', '调研', '了解']):
-            theme = "调研"
-        elif any(word in content_lower for word in ['测试', '验证', '检查']):
-            theme = "验证"
-        else:
-            theme = "执行"
-        
-        # 交付物匹配
-        if any(word in content_lower for word in ['文档', '报告', '方案']):
-            deliverable = "文档"
-        elif any(word in content_lower for word in ['代码', '程序', '功能']):
-            deliverable = "代码/功能"
-        elif any(word in content_lower for word in ['测试', '验证']):
-            deliverable = "测试结果"
-        else:
-            deliverable = "阶段性成果"
+
+    async def suggest_steps_batch(
+        self,
+        requests: List[Tuple[str, int]]
+    ) -> List[Union[List[Dict[str, Any]], BaseException]]:
+        """并发拆解多个任务（受 llm_limiter 限制），按输入顺序返回步骤列表或失败原因"""
+        # 相同的提示词只请求一次
+        unique = list(dict.fromkeys(requests))
+        outcomes = await asyncio.gather(
+            *(self._request_steps(task_title, max_steps) for task_title, max_steps in unique),
+            return_exceptions=True
+        )
+        by_request = dict(zip(unique, outcomes))
+        for (task_title, max_steps), outcome in by_request.items():
+            if isinstance(outcome, BaseException):
+                logger.error("Error generating steps", task_title=task_title, error=str(outcome))
+        return [by_request[request] for request in requests]
+
+    async def stream_steps(self, task_title: str, max_steps: int = 9) -> AsyncIterator[Dict[str, Any]]:
+        """流式拆解：从token流中逐行解析，每完成一个步骤立即产出"""
+        cached = await decomposition_cache.get(task_title, max_steps)
+        if cached:
+            for step in self._classify_steps(cached):
+                yield step
+            return
         
-        # 时间估算
-        if any(word in content_lower for word in ['简单', '快速', '初步']):
-            estimate = 15
-        elif any(word in content_lower for word in ['复杂', '详细', '深入']):
-            estimate = 60
-        else:
-            estimate = 30
+        steps = []
+        started = time.perf_counter()
+        first_token = True
+        outcome = "error"
+        stream = None
+        try:
+            # 只限制发起请求，流式读取不占用并发名额
+            async with llm_limiter.slot():
+                started = time.perf_counter()
+                stream = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=self._build_messages(task_title, max_steps),
+                    temperature=0.7,
+                    max_tokens=1000,
+                    stream=True
+                )
+            
+            buffer = ""
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content or ""
+                if content and first_token:
+                    first_token = False
+                    LLM_FIRST_TOKEN.observe(time.perf_counter() - started, "decompose_stream")
+                buffer += content
+                
+                # 只有遇到换行才说明一行已经完整
+                *lines, buffer = buffer.split('\n')
+                for line in lines:
+                    step = self._parse_step_line(line, len(steps) + 1)
+                    if step:
+                        steps.append(step)
+                        yield step
+                        if len(steps) >= max_steps:
+                            # 已达上限，提前返回，由 finally 断开连接不再接收剩余token
+                            outcome = "ok"
+                            await decomposition_cache.put(task_title, max_steps, [step["content"] for step in steps])
+                            return
+            
+            # 最后一行可能没有换行符
+            step = self._parse_step_line(buffer, len(steps) + 1)
+            if step:
+                steps.append(step)
+                yield step
+            
+            outcome = "ok"
+            await decomposition_cache.put(task_title, max_steps, [step["content"] for step in steps])
+                
+        except Exception as e:
+            logger.error("Error streaming steps", error=str(e), steps_received=len(steps))
+        except (GeneratorExit, asyncio.CancelledError):
+            # 客户端断开，不算作模型请求失败
+            outcome = "cancelled"
+            raise
+        finally:
+            # 无论正常结束、达到上限、出错还是客户端断开都关闭上游响应，连接归还共享连接池
+            if stream is not None:
+                await stream.response.aclose()
+            _record_llm("decompose_stream", task_title, time.perf_counter() - started, outcome)
         
-        return tool, theme, deliverable, estimate
+        # 如果GPT没有返回任何步骤，使用备用方案
+        if not steps:
+            for step in self._fallback_steps(task_title):
+                yield step
     
     def _fallback_steps(self, task_title: str) -> List[Dict[str, Any]]:
         """备用步骤生成"""
@@ -209,15 +384,17 @@ class AgentService:
             }
         ]
 
-    def estimate_total_duration(self, steps: List[Dict[str, Any]]) -> int:
+    @staticmethod
+    def estimate_total_duration(steps: List[Dict[str, Any]]) -> int:
         """计算步骤总预估时间"""
         return sum(step.get("estimate_minutes", 0) for step in steps)
 
-    def compose_summary(self, task_id: str) -> str:
+    async def compose_summary(self, task_id: str) -> str:
         """生成任务完成总结"""
-        with Session(engine) as session:
-            from models import Task
-            task = session.exec(select(Task).where(Task.id == task_id)).first()
+        async with async_session() as session:
+            task = (await session.exec(
+                select(Task).where(Task.id == task_id).options(selectinload(Task.steps))
+            )).first()
             if not task:
                 return "任务未找到"
             
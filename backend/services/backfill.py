@@ -0,0 +1,154 @@
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Sequence
+from uuid import UUID
+
+import structlog
+from sqlalchemy import bindparam, update
+from sqlmodel import select
+
+from models import BackfillCheckpoint, Step, Task, async_session
+from services.agent import AgentService
+from services.changes import ChangeService
+from services.classifier import ATTRIBUTES, StepClassifier, step_classifier
+from services.stats import StatsService
+from services.summary import SummaryService, date_key_for
+
+logger = structlog.get_logger()
+
+# 每批处理的任务数，内存占用只与批大小有关
+BACKFILL_BATCH_SIZE = int(os.getenv("TASKAGENT_BACKFILL_BATCH_SIZE", "500"))
+RECLASSIFY_JOB = "reclassify-steps"
+STATS_FIELDS = frozenset(("theme", "tool", "estimate_minutes"))
+
+Progress = Callable[[Dict[str, int]], None]
+
+class BackfillService:
+    @staticmethod
+    async def reclassify_steps(
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        fields: Sequence[str] = ATTRIBUTES,
+        classifier: StepClassifier = step_classifier,
+        restart: bool = False,
+        dry_run: bool = False,
+        progress: Optional[Progress] = None
+    ) -> Dict[str, int]:
+        """按当前规则重新分配已有步骤的属性，并重算任务总预估时间。
+        按任务ID键集分页，每批在一个事务中批量更新并保存断点，中断后再次运行会从断点继续"""
+        unknown = [field for field in fields if field not in ATTRIBUTES]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        step_table = Step.__table__
+        task_table = Task.__table__
+        stats = {"tasks": 0, "steps": 0, "changed_steps": 0, "changed_tasks": 0}
+
+        async with async_session() as session:
+            checkpoint = await session.get(BackfillCheckpoint, RECLASSIFY_JOB)
+            if checkpoint and restart:
+                await session.delete(checkpoint)
+                checkpoint = None
+            if checkpoint is None:
+                checkpoint = BackfillCheckpoint(name=RECLASSIFY_JOB)
+            elif checkpoint.cursor:
+                logger.info("Resuming backfill", job=RECLASSIFY_JOB, cursor=checkpoint.cursor)
+            cursor = UUID(hex=checkpoint.cursor) if checkpoint.cursor else None
+
+            while True:
+                statement = select(Task.id, Task.estimated_minutes, Task.completed_at).order_by(Task.id).limit(batch_size)
+                if cursor:
+                    statement = statement.where(Task.id > cursor)
+                tasks = (await session.exec(statement)).all()
+                if not tasks:
+                    break
+
+                steps = (await session.exec(
+                    select(
+                        Step.id, Step.task_id, Step.order_idx, Step.content,
+                        Step.tool, Step.theme, Step.deliverable, Step.estimate_minutes, Step.done
+                    )
+                    .where(Step.task_id.in_([task.id for task in tasks]))
+                    .order_by(Step.task_id, Step.order_idx)
+                )).all()
+
+                attributes = classifier.classify_many([(step.content, step.order_idx + 1) for step in steps])
+                step_updates = []
+                # (实体, 操作, 任务ID, 实体ID, 变化字段)，提交前批量写入变更日志
+                deltas = []
+                task_steps = defaultdict(list)
+                completed = {task.id: task.completed_at for task in tasks if task.completed_at}
+                # 已完成任务中已完成步骤的主题/工具/时间变化后，当天的统计细分需要重算
+                stale_days = set()
+                for step, assigned in zip(steps, attributes):
+                    current = {field: getattr(step, field) for field in ATTRIBUTES}
+                    new = {**current, **{field: getattr(assigned, field) for field in fields}}
+                    task_steps[step.task_id].append(new)
+                    delta = {field: value for field, value in new.items() if value != current[field]}
+                    if delta:
+                        step_updates.append({"step_id": step.id, **{f"new_{field}": new[field] for field in ATTRIBUTES}})
+                        deltas.append(("step", "updated", step.task_id, step.id, delta))
+                        if step.done and step.task_id in completed and STATS_FIELDS.intersection(delta):
+                            stale_days.add(date_key_for(completed[step.task_id]))
+
+                task_updates = []
+                minute_deltas: Dict[str, int] = defaultdict(int)
+                for task in tasks:
+                    total = AgentService.estimate_total_duration(task_steps.get(task.id, []))
+                    if total == task.estimated_minutes:
+                        continue
+                    task_updates.append({"task_id": task.id, "new_estimated_minutes": total})
+                    deltas.append(("task", "updated", task.id, task.id, {"estimated_minutes": total}))
+                    # 已完成任务的预估时间计入当天成就
+                    if task.completed_at:
+                        minute_deltas[date_key_for(task.completed_at)] += total - task.estimated_minutes
+
+                stats["tasks"] += len(tasks)
+                stats["steps"] += len(steps)
+                stats["changed_steps"] += len(step_updates)
+                stats["changed_tasks"] += len(task_updates)
+                cursor = tasks[-1].id
+
+                if not dry_run:
+                    if step_updates:
+                        await session.execute(
+                            update(step_table)
+                            .where(step_table.c.id == bindparam("step_id"))
+                            .values(**{field: bindparam(f"new_{field}") for field in ATTRIBUTES}),
+                            step_updates
+                        )
+                    if task_updates:
+                        await session.execute(
+                            update(task_table)
+                            .where(task_table.c.id == bindparam("task_id"))
+                            .values(estimated_minutes=bindparam("new_estimated_minutes")),
+                            task_updates
+                        )
+                    await SummaryService.apply_deltas(session, {
+                        date_key: (0, 0, minutes) for date_key, minutes in minute_deltas.items() if minutes
+                    })
+                    for date_key in stale_days:
+                        await StatsService.invalidate(session, date_key)
+                    # 回填可能涉及大量记录，只写入变更日志而不实时推送，客户端发现序号跳跃后通过 since 接口补齐
+                    await ChangeService.record_many(session, deltas)
+
+                    # 断点与本批数据在同一事务中提交
+                    checkpoint.cursor = cursor.hex
+                    checkpoint.processed += len(steps)
+                    checkpoint.changed += len(step_updates)
+                    checkpoint.updated_at = datetime.utcnow()
+                    session.add(checkpoint)
+                    await session.commit()
+
+                if progress:
+                    progress(dict(stats))
+
+            if not dry_run and checkpoint.cursor is not None:
+                # 全部完成后删除断点，下次运行从头开始
+                await session.delete(checkpoint)
+                await session.commit()
+
+        if not dry_run and (stats["changed_steps"] or stats["changed_tasks"]):
+            # 命令行运行时没有后台任务队列，直接清理超出保留条数的变更日志
+            await ChangeService.prune()
+        return stats
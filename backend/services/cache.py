@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+import structlog
+from sqlalchemy import delete, or_
+from sqlmodel import select
+
+from models import DecompositionCache, async_session
+
+logger = structlog.get_logger()
+
+CACHE_TTL_SECONDS = int(os.getenv("TASKAGENT_DECOMPOSITION_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MEMORY_SIZE = int(os.getenv("TASKAGENT_DECOMPOSITION_CACHE_MEMORY_SIZE", "256"))
+CACHE_PERSISTENT_SIZE = int(os.getenv("TASKAGENT_DECOMPOSITION_CACHE_PERSISTENT_SIZE", "10000"))
+
+def normalize_prompt(prompt: str) -> str:
+    """全角转半角、去掉多余空白、统一小写，让近似相同的任务命中同一条缓存"""
+    prompt = unicodedata.normalize("NFKC", prompt)
+    return " ".join(prompt.split()).lower()
+
+class StepDecompositionCache:
+    """AI步骤拆解结果缓存：内存LRU + SQLite持久层，均带TTL和容量上限。
+    只缓存模型给出的步骤内容，工具/主题等属性在读取时按当前规则重新分类，规则文件修改后立即生效"""
+
+    def __init__(
+        self,
+        ttl_seconds: int = CACHE_TTL_SECONDS,
+        memory_size: int = CACHE_MEMORY_SIZE,
+        persistent_size: int = CACHE_PERSISTENT_SIZE
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.memory_size = memory_size
+        self.persistent_size = persistent_size
+        self._memory: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def make_key(self, prompt: str, max_steps: int) -> str:
+        # 带上格式前缀，旧版本缓存的完整步骤（含分类结果）不再命中，由TTL和容量淘汰
+        raw = f"contents\n{max_steps}\n{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, prompt: str, max_steps: int) -> Optional[List[str]]:
+        if not self.enabled:
+            return None
+        
+        key = self.make_key(prompt, max_steps)
+        now = time.time()
+        
+        entry = self._memory.get(key)
+        if entry:
+            stored_at, steps = entry
+            if now - stored_at < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return list(steps)
+            del self._memory[key]
+        
+        try:
+            async with async_session() as session:
+                row = await session.get(DecompositionCache, key)
+                if row:
+                    age = (datetime.utcnow() - row.created_at).total_seconds()
+                    if age < self.ttl_seconds:
+                        steps = json.loads(row.steps_json)
+                        self._remember(key, now - age, steps)
+                        self.persistent_hits += 1
+                        return list(steps)
+                    await session.delete(row)
+                    await session.commit()
+        except Exception as e:
+            logger.error("Decomposition cache read failed", error=str(e))
+        
+        self.misses += 1
+        return None
+
+    async def put(self, prompt: str, max_steps: int, steps: List[str]):
+        if not self.enabled or not steps:
+            return
+        
+        key = self.make_key(prompt, max_steps)
+        steps = list(steps)
+        self._remember(key, time.time(), steps)
+        self.stores += 1
+        
+        try:
+            async with async_session() as session:
+                row = await session.get(DecompositionCache, key)
+                if row:
+                    row.steps_json = json.dumps(steps, ensure_ascii=False)
+                    row.created_at = datetime.utcnow()
+                else:
+                    row = DecompositionCache(key=key, steps_json=json.dumps(steps, ensure_ascii=False))
+                session.add(row)
+                await session.flush()
+                
+                # 淘汰过期条目，以及超出容量的最旧条目
+                cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+                overflow = (
+                    select(DecompositionCache.key)
+                    .order_by(DecompositionCache.created_at.desc())
+                    .offset(self.persistent_size)
+                )
+                await session.exec(
+                    delete(DecompositionCache).where(or_(
+                        DecompositionCache.created_at < cutoff,
+                        DecompositionCache.key.in_(overflow)
+                    ))
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error("Decomposition cache write failed", error=str(e))
+
+    def _remember(self, key: str, stored_at: float, steps: List[str]):
+        self._memory[key] = (stored_at, steps)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "memory_entries": len(self._memory)
+        }
+
+decomposition_cache = StepDecompositionCache()
@@ -0,0 +1,112 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+import structlog
+from sqlalchemy import delete, func, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import ChangeEvent, async_session
+from serializers import dumps
+from job_queue import job_queue
+from websocket_manager import notify_changes
+
+logger = structlog.get_logger()
+
+# 变更日志保留的条数，客户端落后超过这个范围时需要全量刷新
+CHANGE_LOG_RETENTION = int(os.getenv("TASKAGENT_CHANGE_LOG_RETENTION", "10000"))
+CHANGE_LOG_PRUNE_EVERY = 500
+
+def _to_message(change: ChangeEvent) -> Dict[str, Any]:
+    return {
+        "type": "delta",
+        "seq": change.seq,
+        "entity": change.entity,
+        "op": change.op,
+        "task_id": change.task_id,
+        "id": change.entity_id,
+        "data": orjson.loads(change.data)
+    }
+
+class ChangeService:
+    @staticmethod
+    def record(
+        session: AsyncSession,
+        entity: str,
+        op: str,
+        task_id: Any,
+        entity_id: Any,
+        data: Any
+    ) -> ChangeEvent:
+        """在写入数据的同一事务中追加变更记录，序号在提交时分配"""
+        change = ChangeEvent(
+            entity=entity,
+            op=op,
+            task_id=str(task_id),
+            entity_id=str(entity_id),
+            data=dumps(data).decode()
+        )
+        session.add(change)
+        return change
+
+    @staticmethod
+    async def record_many(session: AsyncSession, entries: List[Tuple[str, str, Any, Any, Any]]):
+        """批量追加 (实体, 操作, 任务ID, 实体ID, 数据) 变更记录，一次 executemany 写入；
+        不返回记录对象，用于不实时推送的大批量写入"""
+        if not entries:
+            return
+        created_at = datetime.utcnow()
+        await session.execute(insert(ChangeEvent.__table__), [
+            {
+                "entity": entity,
+                "op": op,
+                "task_id": str(task_id),
+                "entity_id": str(entity_id),
+                "data": dumps(data).decode(),
+                "created_at": created_at
+            }
+            for entity, op, task_id, entity_id, data in entries
+        ])
+
+    @staticmethod
+    async def publish(changes: List[ChangeEvent]):
+        """事务提交后推送增量事件；客户端发现序号不连续时通过 since 接口补齐"""
+        await notify_changes([(change.task_id, _to_message(change)) for change in changes])
+        if any(change.seq % CHANGE_LOG_PRUNE_EVERY == 0 for change in changes):
+            job_queue.submit("changes:prune", ChangeService.prune)
+
+    @staticmethod
+    async def latest_seq() -> int:
+        async with async_session() as session:
+            return (await session.exec(select(func.max(ChangeEvent.seq)))).one() or 0
+
+    @staticmethod
+    async def since(seq: int, limit: int = 500) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """返回序号大于 seq 的变更、当前最新序号，以及是否需要全量刷新"""
+        async with async_session() as session:
+            latest, oldest = (await session.exec(
+                select(func.max(ChangeEvent.seq), func.min(ChangeEvent.seq))
+            )).one()
+            latest = latest or 0
+            # 请求的序号之后的记录已被清理（或序号来自重建前的数据库），增量无法补齐
+            if seq > latest or (oldest is not None and seq < oldest - 1):
+                return [], latest, True
+
+            changes = (await session.exec(
+                select(ChangeEvent).where(ChangeEvent.seq > seq).order_by(ChangeEvent.seq).limit(limit)
+            )).all()
+            return [_to_message(change) for change in changes], latest, False
+
+    @staticmethod
+    async def prune(retention: Optional[int] = None) -> int:
+        retention = CHANGE_LOG_RETENTION if retention is None else retention
+        async with async_session() as session:
+            latest = (await session.exec(select(func.max(ChangeEvent.seq)))).one() or 0
+            result = await session.execute(
+                delete(ChangeEvent).where(ChangeEvent.seq <= latest - retention)
+            )
+            await session.commit()
+        logger.info("Pruned change log", removed=result.rowcount, latest_seq=latest)
+        return result.rowcount
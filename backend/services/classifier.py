@@ -0,0 +1,92 @@
+import os
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+# 规则文件可通过环境变量替换，调整关键词和预估时间无需改代码
+STEP_RULES_PATH = os.getenv(
+    "TASKAGENT_STEP_RULES",
+    str(Path(__file__).resolve().parent.parent / "step_rules.json")
+)
+
+ATTRIBUTES = ("tool", "theme", "deliverable", "estimate_minutes")
+
+class StepAttributes(NamedTuple):
+    tool: str
+    theme: str
+    deliverable: str
+    estimate_minutes: int
+
+class StepClassifier:
+    """按关键词规则为步骤分配工具、主题、交付物和预估时间。
+    每个属性的规则按顺序匹配，第一条包含任一关键词的规则生效。
+    规则在加载时编译成去重后的关键词表：每个关键词预先算好它在四个属性中的规则序号，
+    并按首字符建立索引，分类时只检查首字符出现在内容中的关键词，一次扫描得到全部属性"""
+
+    def __init__(self, rules: Dict[str, Any]):
+        missing = [attribute for attribute in ATTRIBUTES if attribute not in rules]
+        if missing:
+            raise ValueError(f"Missing step rules for: {', '.join(missing)}")
+
+        # 序号等于规则数表示未命中，取默认值
+        self.values = [
+            [rule["value"] for rule in rules[attribute]["rules"]] + [rules[attribute]["default"]]
+            for attribute in ATTRIBUTES
+        ]
+        self.no_match = tuple(len(values) - 1 for values in self.values)
+        # 第一步固定取值（例如主题总是“规划”），未配置的属性按关键词匹配
+        self.first_step = {
+            attribute: rules[attribute]["first_step"]
+            for attribute in ATTRIBUTES
+            if rules[attribute].get("first_step") is not None
+        }
+
+        ranks: Dict[str, Tuple[int, ...]] = {}
+        for i, attribute in enumerate(ATTRIBUTES):
+            for rank, rule in enumerate(rules[attribute]["rules"]):
+                for keyword in rule["keywords"]:
+                    keyword = keyword.lower()
+                    if not keyword:
+                        continue
+                    current = list(ranks.get(keyword, self.no_match))
+                    current[i] = min(current[i], rank)
+                    ranks[keyword] = tuple(current)
+
+        self._by_first_char: Dict[str, List[Tuple[str, Tuple[int, ...]]]] = {}
+        for keyword, keyword_ranks in ranks.items():
+            self._by_first_char.setdefault(keyword[0], []).append((keyword, keyword_ranks))
+        self._first_chars = frozenset(self._by_first_char)
+
+    @classmethod
+    def from_file(cls, path: str) -> "StepClassifier":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _ranks(self, content: str) -> Tuple[int, ...]:
+        content = content.lower()
+        hits = [
+            keyword_ranks
+            for char in self._first_chars.intersection(content)
+            for keyword, keyword_ranks in self._by_first_char[char]
+            if keyword in content
+        ]
+        if not hits:
+            return self.no_match
+        return tuple(map(min, zip(self.no_match, *hits)))
+
+    def _resolve(self, ranks: Tuple[int, ...], step_num: int) -> StepAttributes:
+        tool, theme, deliverable, estimate = self.values
+        attributes = StepAttributes(tool[ranks[0]], theme[ranks[1]], deliverable[ranks[2]], estimate[ranks[3]])
+        if step_num == 1 and self.first_step:
+            attributes = attributes._replace(**self.first_step)
+        return attributes
+
+    def classify(self, content: str, step_num: int) -> StepAttributes:
+        return self._resolve(self._ranks(content), step_num)
+
+    def classify_many(self, items: Sequence[Tuple[str, int]]) -> List[StepAttributes]:
+        """批量分类 (内容, 步骤序号)，用于解析模型回复、批量导入和重新分类"""
+        ranks, resolve = self._ranks, self._resolve
+        return [resolve(ranks(content), step_num) for content, step_num in items]
+
+step_classifier = StepClassifier.from_file(STEP_RULES_PATH)
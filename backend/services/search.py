@@ -0,0 +1,250 @@
+import re
+import html
+import base64
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlmodel import select
+
+from models import Step, async_engine, async_session
+from schemas import TaskSearchHit
+
+MAX_QUERY_TERMS = 8
+# 标题命中的权重高于步骤内容
+TITLE_WEIGHT = 10.0
+SNIPPET_CHARS = 48
+
+STATUS_FILTERS = {
+    "all": None,
+    "open": "t.completed_at IS NULL",
+    "completed": "t.completed_at IS NOT NULL",
+}
+
+def _grams_sql(column: str) -> str:
+    """把文本拆成重叠的两字片段（最后一个字单独成段），空格分隔；例如 收集资料 -> 收集 集资 资料 料"""
+    return (
+        "(WITH RECURSIVE g(i, s) AS (SELECT 0, '' UNION ALL "
+        f"SELECT i + 1, s || ' ' || substr({column}, i + 1, 2) FROM g WHERE i < length({column})) "
+        "SELECT s FROM g ORDER BY i DESC LIMIT 1)"
+    )
+
+def _index_statements(entity: str, table: str, text_column: str, extra_columns: Tuple[str, ...] = ()) -> List[str]:
+    """外部内容索引建在 {entity}_search_rows 上：它的 INTEGER PRIMARY KEY 不会像 tasks/steps
+    的隐式 rowid 那样在 VACUUM 后重新编号；两字片段用 unicode61 分词，一两个字的中文词也走索引"""
+    rows = f"{entity}_search_rows"
+    fts = f"{entity}_search"
+    copied = "".join(f", {column}" for column in extra_columns)
+    copied_new = "".join(f", new.{column}" for column in extra_columns)
+    grams = _grams_sql(f"new.{text_column}")
+    return [
+        # 旧版本建在 tasks/steps rowid 上的索引和触发器
+        f"DROP TRIGGER IF EXISTS {fts}_insert",
+        f"DROP TRIGGER IF EXISTS {fts}_update",
+        f"DROP TRIGGER IF EXISTS {fts}_delete",
+        f"DROP TABLE IF EXISTS {fts}",
+        f"DROP TABLE IF EXISTS {rows}",
+        f"CREATE TABLE {rows} (key INTEGER PRIMARY KEY, id CHAR(32) NOT NULL UNIQUE"
+        f"{''.join(f', {column} CHAR(32) NOT NULL' for column in extra_columns)}, grams TEXT NOT NULL)",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5(grams, content='{rows}', content_rowid='key', tokenize='unicode61')",
+        f"CREATE TRIGGER {rows}_insert AFTER INSERT ON {rows} BEGIN "
+        f"INSERT INTO {fts} (rowid, grams) VALUES (new.key, new.grams); "
+        "END",
+        f"CREATE TRIGGER {rows}_update AFTER UPDATE ON {rows} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, grams) VALUES ('delete', old.key, old.grams); "
+        f"INSERT INTO {fts} (rowid, grams) VALUES (new.key, new.grams); "
+        "END",
+        f"CREATE TRIGGER {rows}_delete AFTER DELETE ON {rows} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, grams) VALUES ('delete', old.key, old.grams); "
+        "END",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {rows} (id{copied}, grams) VALUES (new.id{copied_new}, {grams}); "
+        "END",
+        # 批量更新步骤时内容列总在 SET 中，内容没变就不重建索引
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {text_column} ON {table} "
+        f"WHEN old.{text_column} IS NOT new.{text_column} BEGIN "
+        f"UPDATE {rows} SET grams = {grams} WHERE id = new.id; "
+        "END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {rows} WHERE id = old.id; "
+        "END",
+        f"INSERT INTO {rows} (id{copied}, grams) SELECT id{copied}, {_grams_sql(text_column)} FROM {table}",
+    ]
+
+# 按当前定义重建搜索索引的语句（迁移和 rebuild-search-index 共用），可重复执行
+SEARCH_INDEX_STATEMENTS = [
+    *_index_statements("task", "tasks", "title"),
+    *_index_statements("step", "steps", "content", ("task_id",)),
+]
+
+def _encode_cursor(score: float, task_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}|{task_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        score, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(score), UUID(hex=task_id).hex
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _terms(query: str) -> List[str]:
+    return list(dict.fromkeys(query.split()))[:MAX_QUERY_TERMS]
+
+def _match_expression(term: str) -> Optional[str]:
+    """把词转换为两字片段索引上的查询：单字按前缀匹配，更长的词是相邻片段组成的短语；
+    没有字母或数字的词分词后为空，返回None改用 LIKE"""
+    if not any(char.isalnum() for char in term):
+        return None
+    if len(term) == 1:
+        grams, prefix = term, "*"
+    else:
+        grams, prefix = " ".join(term[i:i + 2] for i in range(len(term) - 1)), ""
+    # 作为带引号的短语，用户输入中的 FTS5 语法字符不会生效
+    return '"' + grams.replace('"', '""') + '"' + prefix
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _highlight(content: str, pattern: Pattern) -> str:
+    """HTML 转义后用 <mark></mark> 标出命中部分"""
+    parts = []
+    last = 0
+    for match in pattern.finditer(content):
+        parts.append(html.escape(content[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(content[last:]))
+    return "".join(parts)
+
+def _snippet(contents: List[str], pattern: Pattern) -> Optional[str]:
+    """取命中词最多的步骤，截取第一个命中附近的一段"""
+    best, best_hits = None, 0
+    for content in contents:
+        hits = len({match.group(0).lower() for match in pattern.finditer(content)})
+        if hits > best_hits:
+            best, best_hits = content, hits
+    if best is None:
+        return None
+    if len(best) > SNIPPET_CHARS:
+        start = max(0, pattern.search(best).start() - SNIPPET_CHARS // 3)
+        end = start + SNIPPET_CHARS
+        best = ("…" if start else "") + best[start:end] + ("…" if end < len(best) else "")
+    return _highlight(best, pattern)
+
+class SearchService:
+    @staticmethod
+    async def rebuild_index():
+        """按 tasks/steps 表重建搜索索引（索引由触发器同步，只在索引损坏时需要）"""
+        async with async_engine.begin() as conn:
+            for statement in SEARCH_INDEX_STATEMENTS:
+                await conn.execute(text(statement))
+
+    @staticmethod
+    async def search_tasks(
+        query: str,
+        status: str = "all",
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按标题和步骤内容检索任务，每个词都要在标题或某个步骤中出现；按相关度排序并游标分页"""
+        if status not in STATUS_FILTERS:
+            raise ValueError(f"Unknown status: {status}")
+        terms = _terms(query)
+        if not terms:
+            raise ValueError("Empty query")
+
+        expressions = {term: _match_expression(term) for term in terms}
+        match_terms = [term for term in terms if expressions[term] is not None]
+        like_terms = [term for term in terms if expressions[term] is None]
+        params: Dict[str, Any] = {"limit": limit + 1}
+        conditions = []
+
+        if match_terms:
+            # 每个词分别在标题和步骤索引中查找，按任务汇总 bm25（越小越相关），只保留命中全部词的任务
+            hits = []
+            for i, term in enumerate(match_terms):
+                params[f"match_{i}"] = expressions[term]
+                hits.append(
+                    f"SELECT r.id AS task_id, {i} AS term, bm25(task_search) * {TITLE_WEIGHT} AS score "
+                    "FROM task_search JOIN task_search_rows r ON r.key = task_search.rowid "
+                    f"WHERE task_search MATCH :match_{i}"
+                )
+                hits.append(
+                    f"SELECT r.task_id, {i}, bm25(step_search) "
+                    "FROM step_search JOIN step_search_rows r ON r.key = step_search.rowid "
+                    f"WHERE step_search MATCH :match_{i}"
+                )
+            source = (
+                f"WITH hits AS ({' UNION ALL '.join(hits)}), "
+                "ranked AS (SELECT task_id, sum(score) AS score FROM hits GROUP BY task_id "
+                f"HAVING count(DISTINCT term) = {len(match_terms)}) "
+                "SELECT t.id, t.title, t.estimated_minutes, t.created_at, t.completed_at, r.score "
+                "FROM ranked r JOIN tasks t ON t.id = r.task_id"
+            )
+            score = "r.score"
+        else:
+            # 没有可用于全文匹配的词时不计算相关度
+            source = (
+                "SELECT t.id, t.title, t.estimated_minutes, t.created_at, t.completed_at, 0.0 "
+                "FROM tasks t"
+            )
+            score = "0.0"
+
+        for i, term in enumerate(like_terms):
+            params[f"like_{i}"] = _like_pattern(term)
+            conditions.append(
+                f"(t.title LIKE :like_{i} ESCAPE '\\' OR EXISTS ("
+                f"SELECT 1 FROM steps s WHERE s.task_id = t.id AND s.content LIKE :like_{i} ESCAPE '\\'))"
+            )
+        if STATUS_FILTERS[status]:
+            conditions.append(STATUS_FILTERS[status])
+        if cursor:
+            params["cursor_score"], params["cursor_id"] = _decode_cursor(cursor)
+            conditions.append(
+                f"({score} > :cursor_score OR ({score} = :cursor_score AND t.id < :cursor_id))"
+            )
+
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        statement = text(f"{source}{where} ORDER BY {score}, t.id DESC LIMIT :limit")
+
+        async with async_session() as session:
+            rows = (await session.execute(statement, params)).all()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = _encode_cursor(rows[-1][5], rows[-1][0])
+
+            # 只为当前页的任务读取步骤，用于计数和生成摘要
+            task_ids = [UUID(hex=row[0]) for row in rows]
+            steps = defaultdict(list)
+            if task_ids:
+                step_rows = (await session.exec(
+                    select(Step.task_id, Step.content, Step.done)
+                    .where(Step.task_id.in_(task_ids))
+                    .order_by(Step.task_id, Step.order_idx)
+                )).all()
+                for task_id, content, done in step_rows:
+                    steps[task_id].append((content, done))
+
+        pattern = re.compile(
+            "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+            re.IGNORECASE
+        )
+        results = []
+        for (_, title, minutes, created_at, completed_at, row_score), task_id in zip(rows, task_ids):
+            task_steps = steps.get(task_id, [])
+            results.append(TaskSearchHit(
+                id=task_id,
+                title=title,
+                estimated_minutes=minutes,
+                created_at=created_at,
+                completed_at=completed_at,
+                step_count=len(task_steps),
+                done_count=sum(1 for _, done in task_steps if done),
+                score=row_score,
+                title_highlight=_highlight(title, pattern) if pattern.search(title) else None,
+                snippet=_snippet([content for content, _ in task_steps], pattern)
+            ).model_dump())
+        return results, next_cursor
@@ -0,0 +1,160 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import bindparam, delete, func, insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Achievement, DailyStat, Step, Task, async_session
+
+BUCKETS = ("day", "week", "month", "year")
+# 约十年按天分桶，限制单次响应的大小
+MAX_RANGE_DAYS = 3660
+DIMENSIONS = (("theme", Step.theme), ("tool", Step.tool))
+
+def _bucket(column, bucket: str):
+    """把 YYYY-MM-DD 日期键映射为分桶键：周取周一的日期，月为 YYYY-MM，年为 YYYY"""
+    if bucket == "week":
+        expr = func.date(column, "weekday 0", "-6 days")
+    elif bucket == "month":
+        expr = func.substr(column, 1, 7)
+    elif bucket == "year":
+        expr = func.substr(column, 1, 4)
+    else:
+        expr = column
+    return expr.label("bucket")
+
+def _add(target: Dict[str, Dict[str, int]], value: str, steps: int, minutes: int):
+    entry = target.setdefault(value, {"steps": 0, "minutes": 0})
+    entry["steps"] += steps
+    entry["minutes"] += minutes
+
+class StatsService:
+    @staticmethod
+    async def invalidate(session: AsyncSession, date_key: str):
+        """在调用方的事务中使某天的主题/工具细分失效（不影响当天总结）"""
+        await session.exec(
+            update(Achievement).where(Achievement.date_key == date_key).values(stats_version=0)
+        )
+
+    @staticmethod
+    async def _refresh_breakdowns(start_key: str, end_key: str):
+        """重算范围内过期日期的细分；与总结相同，只有计算期间数据未变化的日期才写回"""
+        async with async_session() as session:
+            versions = dict((await session.exec(
+                select(Achievement.date_key, Achievement.summary_version).where(
+                    Achievement.date_key >= start_key,
+                    Achievement.date_key <= end_key,
+                    Achievement.stats_version != Achievement.summary_version
+                )
+            )).all())
+            if not versions:
+                return
+
+            # 一次分组查询覆盖所有过期日期所在的时间段，再丢弃未过期日期的结果
+            day = func.date(Task.completed_at)
+            start_dt = datetime.strptime(min(versions), "%Y-%m-%d")
+            end_dt = datetime.strptime(max(versions), "%Y-%m-%d") + timedelta(days=1)
+            rows = []
+            for dimension, column in DIMENSIONS:
+                value = func.coalesce(column, "")
+                for date_key, key, steps, minutes in (await session.exec(
+                    select(day, value, func.count(Step.id), func.coalesce(func.sum(Step.estimate_minutes), 0))
+                    .join(Task, Task.id == Step.task_id)
+                    .where(Step.done == True, Task.completed_at >= start_dt, Task.completed_at < end_dt)
+                    .group_by(day, value)
+                )).all():
+                    if date_key in versions:
+                        rows.append({
+                            "date_key": date_key, "dimension": dimension, "value": key,
+                            "step_count": steps, "minutes": minutes
+                        })
+            await session.commit()
+
+            # 先按版本号写入标记（同时取得写锁），此后版本号仍等于读取时的日期才替换细分
+            achievement_table = Achievement.__table__
+            await session.execute(
+                update(achievement_table)
+                .where(
+                    achievement_table.c.date_key == bindparam("day_key"),
+                    achievement_table.c.summary_version == bindparam("day_version")
+                )
+                .values(stats_version=bindparam("day_version")),
+                [{"day_key": key, "day_version": version} for key, version in versions.items()]
+            )
+            current = (await session.exec(
+                select(Achievement.date_key, Achievement.summary_version).where(Achievement.date_key.in_(list(versions)))
+            )).all()
+            fresh = {key for key, version in current if versions[key] == version}
+            if fresh:
+                await session.execute(delete(DailyStat).where(DailyStat.date_key.in_(fresh)))
+                rows = [row for row in rows if row["date_key"] in fresh]
+                if rows:
+                    await session.execute(insert(DailyStat.__table__), rows)
+            await session.commit()
+
+    @staticmethod
+    async def range_stats(start: date, end: date, bucket: str = "day", breakdown: bool = True) -> Dict[str, Any]:
+        """按天/周/月/年汇总日期范围内完成的任务、步骤和时间，只返回有记录的分桶；
+        breakdown 为真时附带按主题和工具的已完成步骤细分"""
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        if start > end:
+            raise ValueError("start must not be after end")
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValueError(f"Range exceeds {MAX_RANGE_DAYS} days")
+        start_key, end_key = start.isoformat(), end.isoformat()
+
+        if breakdown:
+            await StatsService._refresh_breakdowns(start_key, end_key)
+
+        buckets: Dict[str, Dict[str, Any]] = {}
+        totals: Dict[str, Any] = {"tasks": 0, "steps": 0, "minutes": 0}
+
+        def entry(key: str) -> Dict[str, Any]:
+            if key not in buckets:
+                buckets[key] = {"key": key, "tasks": 0, "steps": 0, "minutes": 0}
+                if breakdown:
+                    buckets[key].update(themes={}, tools={})
+            return buckets[key]
+
+        async with async_session() as session:
+            key = _bucket(Achievement.date_key, bucket)
+            for bucket_key, tasks, steps, minutes in (await session.exec(
+                select(
+                    key,
+                    func.sum(Achievement.task_count),
+                    func.sum(Achievement.step_count),
+                    func.sum(Achievement.consumed_minutes)
+                )
+                .where(Achievement.date_key >= start_key, Achievement.date_key <= end_key)
+                .group_by(key)
+            )).all():
+                # 任务被重复完成后原来那天的计数可能归零
+                if not (tasks or steps or minutes):
+                    continue
+                item = entry(bucket_key)
+                item.update(tasks=tasks, steps=steps, minutes=minutes)
+                totals["tasks"] += tasks
+                totals["steps"] += steps
+                totals["minutes"] += minutes
+
+            if breakdown:
+                totals.update(themes={}, tools={})
+                key = _bucket(DailyStat.date_key, bucket)
+                for bucket_key, dimension, value, steps, minutes in (await session.exec(
+                    select(key, DailyStat.dimension, DailyStat.value, func.sum(DailyStat.step_count), func.sum(DailyStat.minutes))
+                    .where(DailyStat.date_key >= start_key, DailyStat.date_key <= end_key)
+                    .group_by(key, DailyStat.dimension, DailyStat.value)
+                )).all():
+                    field = f"{dimension}s"
+                    _add(entry(bucket_key)[field], value, steps, minutes)
+                    _add(totals[field], value, steps, minutes)
+
+        return {
+            "start": start_key,
+            "end": end_key,
+            "bucket": bucket,
+            "totals": totals,
+            "buckets": [buckets[key] for key in sorted(buckets)]
+        }
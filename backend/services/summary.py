@@ -1,136 +1,295 @@
+import base64
 from datetime import datetime, date
-from typing import List, Optional
-from sqlmodel import Session, select
-from models import Achievement, Task, Step, engine
+from typing import List, Optional, Dict, Any, Tuple
+from uuid import uuid4
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+from models import Achievement, Task, Step, async_session
+
+def date_key_for(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d")
+
+def _day_range(date_key: str) -> Tuple[datetime, datetime]:
+    target_date = datetime.strptime(date_key, "%Y-%m-%d").date()
+    start_dt = datetime.combine(target_date, datetime.min.time())
+    end_dt = datetime.combine(target_date, datetime.max.time())
+    return start_dt, end_dt
+
+def _encode_cursor(date_key: str) -> str:
+    return base64.urlsafe_b64encode(date_key.encode()).decode()
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        date_key = base64.urlsafe_b64decode(cursor.encode()).decode()
+        datetime.strptime(date_key, "%Y-%m-%d")
+        return date_key
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _done_steps_subquery():
+    return select(func.count(Step.id)).where(Step.task_id == Task.id, Step.done == True).scalar_subquery()
 
 class SummaryService:
     @staticmethod
-    def daily(date_key: str) -> str:
+    async def daily(date_key: str) -> str:
         """获取指定日期的总结"""
-        with Session(engine) as session:
-            # 查找指定日期的成就记录
-            statement = select(Achievement).where(Achievement.date_key == date_key)
-            achievement = session.exec(statement).first()
-            
-            if achievement:
-                return achievement.summary_md
-            
-            # 如果没有成就记录，生成新的总结
-            target_date = datetime.strptime(date_key, "%Y-%m-%d").date()
-            start_dt = datetime.combine(target_date, datetime.min.time())
-            end_dt = datetime.combine(target_date, datetime.max.time())
-            
-            # 查找当天完成的任务
-            tasks = session.exec(
-                select(Task).where(
-                    Task.completed_at >= start_dt,
-                    Task.completed_at <= end_dt
-                )
-            ).all()
-            
-            if not tasks:
-                return f"# 📅 {date_key} 总结\n\n今天还没有完成的任务。"
-            
-            # 计算统计数据
-            total_tasks = len(tasks)
-            total_steps = 0
-            total_minutes = 0
-            
-            summary = f"# 📅 {date_key} 任务总结\n\n"
-            summary += f"**今日完成任务：** {total_tasks} 个\n\n"
-            
-            for task in tasks:
-                task_steps = session.exec(select(Step).where(Step.task_id == task.id)).all()
-                completed_steps = [s for s in task_steps if s.done]
-                
-                total_steps += len(completed_steps)
-                total_minutes += task.estimated_minutes
-                
-                summary += f"## 🎯 {task.title}\n"
-                summary += f"- 完成步骤：{len(completed_steps)}/{len(task_steps)}\n"
-                summary += f"- 预估时间：{task.estimated_minutes} 分钟\n\n"
+        async with async_session() as session:
+            return await SummaryService._materialize(session, date_key)
+
+    @staticmethod
+    async def _materialize(session: AsyncSession, date_key: str) -> str:
+        """返回当天总结：缓存版本仍有效则直接返回，否则重新生成并写回"""
+        # 查找指定日期的成就记录
+        statement = select(Achievement).where(Achievement.date_key == date_key)
+        achievement = (await session.exec(statement)).first()
+        
+        if achievement and achievement.rendered_version == achievement.summary_version:
+            return achievement.summary_md
+        
+        # 与版本号在同一读事务中生成，保证内容与版本一致
+        summary_md = await SummaryService._render_daily(session, date_key)
+        
+        if achievement:
+            version = achievement.summary_version
+            # 先结束读事务；只有生成期间版本未变化时才写回，否则保持过期状态
+            await session.commit()
+            await session.exec(
+                update(Achievement)
+                .where(Achievement.id == achievement.id, Achievement.summary_version == version)
+                .values(summary_md=summary_md, rendered_version=version)
+            )
+            await session.commit()
+        
+        return summary_md
+
+    @staticmethod
+    async def _render_daily(session: AsyncSession, date_key: str) -> str:
+        """根据当天完成的任务生成总结Markdown"""
+        start_dt, end_dt = _day_range(date_key)
+        
+        # 查找当天完成的任务（步骤一次性预加载）
+        tasks = (await session.exec(
+            select(Task).where(
+                Task.completed_at >= start_dt,
+                Task.completed_at <= end_dt
+            ).options(selectinload(Task.steps))
+        )).all()
+        
+        if not tasks:
+            return f"# 📅 {date_key} 总结\n\n今天还没有完成的任务。"
+        
+        # 计算统计数据
+        total_tasks = len(tasks)
+        total_steps = 0
+        total_minutes = 0
+        
+        summary = f"# 📅 {date_key} 任务总结\n\n"
+        summary += f"**今日完成任务：** {total_tasks} 个\n\n"
+        
+        for task in tasks:
+            task_steps = task.steps
+            completed_steps = [s for s in task_steps if s.done]
             
-            summary += f"---\n\n"
-            summary += f"**总计：**\n"
-            summary += f"- 完成任务：{total_tasks} 个\n"
-            summary += f"- 完成步骤：{total_steps} 个\n"
-            summary += f"- 总耗时：{total_minutes} 分钟\n\n"
-            summary += "🎉 今天表现很棒！"
+            total_steps += len(completed_steps)
+            total_minutes += task.estimated_minutes
             
-            return summary
+            summary += f"## 🎯 {task.title}\n"
+            summary += f"- 完成步骤：{len(completed_steps)}/{len(task_steps)}\n"
+            summary += f"- 预估时间：{task.estimated_minutes} 分钟\n\n"
+        
+        summary += f"---\n\n"
+        summary += f"**总计：**\n"
+        summary += f"- 完成任务：{total_tasks} 个\n"
+        summary += f"- 完成步骤：{total_steps} 个\n"
+        summary += f"- 总耗时：{total_minutes} 分钟\n\n"
+        summary += "🎉 今天表现很棒！"
+        
+        return summary
+
+    @staticmethod
+    async def apply_delta(
+        session: AsyncSession,
+        date_key: str,
+        tasks: int = 0,
+        steps: int = 0,
+        minutes: int = 0
+    ):
+        """在调用方的事务中增量更新某天的成就计数（不存在则创建），并使当天总结失效"""
+        await SummaryService.apply_deltas(session, {date_key: (tasks, steps, minutes)})
 
     @staticmethod
-    def save(task_id: str, summary_md: str) -> Achievement:
+    async def apply_deltas(session: AsyncSession, deltas: Dict[str, Tuple[int, int, int]]):
+        """同 apply_delta，一次 executemany 更新多天的 (任务数, 步骤数, 分钟数) 增量"""
+        if not deltas:
+            return
+        table = Achievement.__table__
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.date_key],
+            set_={
+                "task_count": table.c.task_count + statement.excluded.task_count,
+                "step_count": table.c.step_count + statement.excluded.step_count,
+                "consumed_minutes": table.c.consumed_minutes + statement.excluded.consumed_minutes,
+                "summary_version": table.c.summary_version + 1
+            }
+        )
+        await session.execute(statement, [
+            {
+                "id": uuid4(),
+                "date_key": date_key,
+                "task_count": tasks,
+                "step_count": steps,
+                "consumed_minutes": minutes,
+                "summary_md": ""
+            }
+            for date_key, (tasks, steps, minutes) in deltas.items()
+        ])
+
+    @staticmethod
+    async def invalidate(session: AsyncSession, date_key: str):
+        """在调用方的事务中使某天的总结失效，下次读取时重新生成"""
+        await session.exec(
+            update(Achievement)
+            .where(Achievement.date_key == date_key)
+            .values(summary_version=Achievement.summary_version + 1)
+        )
+
+    @staticmethod
+    async def save(task_id: str, summary_md: str) -> Optional[Achievement]:
         """保存任务总结到成就"""
-        with Session(engine) as session:
+        async with async_session() as session:
             # 获取任务信息
-            task = session.exec(select(Task).where(Task.id == task_id)).first()
+            task = (await session.exec(select(Task).where(Task.id == task_id))).first()
             if not task:
                 raise ValueError("Task not found")
             
             # 获取日期键
             date_key = task.completed_at.strftime("%Y-%m-%d") if task.completed_at else datetime.now().strftime("%Y-%m-%d")
-            
+        
+        return await SummaryService.refresh_summary(date_key)
+
+    @staticmethod
+    async def refresh_summary(date_key: str) -> Optional[Achievement]:
+        """预先生成当天总结（已是最新则不做任何事）"""
+        async with async_session() as session:
+            await SummaryService._materialize(session, date_key)
+            statement = select(Achievement).where(Achievement.date_key == date_key)
+            return (await session.exec(statement)).first()
+
+    @staticmethod
+    async def rollup(date_key: str) -> Achievement:
+        """按任务数据完整重算指定日期的成就汇总（用于修复增量计数漂移）"""
+        async with async_session() as session:
             # 查找或创建成就记录
             statement = select(Achievement).where(Achievement.date_key == date_key)
-            achievement = session.exec(statement).first()
+            achievement = (await session.exec(statement)).first()
             
             # 计算当天统计数据
-            target_date = datetime.strptime(date_key, "%Y-%m-%d").date()
-            start_dt = datetime.combine(target_date, datetime.min.time())
-            end_dt = datetime.combine(target_date, datetime.max.time())
-            
-            tasks = session.exec(
-                select(Task).where(
+            start_dt, end_dt = _day_range(date_key)
+            total_tasks, total_steps, total_minutes = (await session.exec(
+                select(
+                    func.count(Task.id),
+                    func.coalesce(func.sum(_done_steps_subquery()), 0),
+                    func.coalesce(func.sum(Task.estimated_minutes), 0)
+                ).where(
                     Task.completed_at >= start_dt,
                     Task.completed_at <= end_dt
                 )
-            ).all()
-            
-            total_tasks = len(tasks)
-            total_steps = 0
-            total_minutes = 0
-            
-            for t in tasks:
-                task_steps = session.exec(select(Step).where(Step.task_id == t.id)).all()
-                completed_steps = [s for s in task_steps if s.done]
-                total_steps += len(completed_steps)
-                total_minutes += t.estimated_minutes
+            )).one()
             
-            if achievement:
-                achievement.task_count = total_tasks
-                achievement.step_count = total_steps
-                achievement.consumed_minutes = total_minutes
-                achievement.summary_md = SummaryService.daily(date_key)
-            else:
-                achievement = Achievement(
-                    date_key=date_key,
-                    task_count=total_tasks,
-                    step_count=total_steps,
-                    consumed_minutes=total_minutes,
-                    summary_md=SummaryService.daily(date_key)
-                )
+            if not achievement:
+                achievement = Achievement(date_key=date_key)
+            achievement.task_count = total_tasks
+            achievement.step_count = total_steps
+            achievement.consumed_minutes = total_minutes
+            achievement.summary_md = await SummaryService._render_daily(session, date_key)
+            achievement.rendered_version = achievement.summary_version
+            # 主题/工具细分在下次查询统计时重算
+            achievement.stats_version = 0
             
             session.add(achievement)
-            session.commit()
-            session.refresh(achievement)
+            await session.commit()
+            await session.refresh(achievement)
             return achievement
 
     @staticmethod
-    def rollup(date_key: str) -> Achievement:
-        """生成指定日期的成就汇总"""
-        return SummaryService.save("", date_key)
+    async def rebuild_achievements(date_key: Optional[str] = None) -> Dict[str, Any]:
+        """重建成就计数，返回重建的天数和计数发生漂移的日期"""
+        if date_key:
+            async with async_session() as session:
+                before = (await session.exec(
+                    select(Achievement).where(Achievement.date_key == date_key)
+                )).first()
+                before_counts = (before.task_count, before.step_count, before.consumed_minutes) if before else None
+            
+            achievement = await SummaryService.rollup(date_key)
+            after_counts = (achievement.task_count, achievement.step_count, achievement.consumed_minutes)
+            return {"days": 1, "drifted": [date_key] if before_counts != after_counts else []}
+        
+        async with async_session() as session:
+            # 一条分组查询算出每天的实际计数
+            day = func.date(Task.completed_at)
+            actual = {
+                row[0]: (row[1], row[2], row[3])
+                for row in (await session.exec(
+                    select(
+                        day,
+                        func.count(Task.id),
+                        func.coalesce(func.sum(_done_steps_subquery()), 0),
+                        func.coalesce(func.sum(Task.estimated_minutes), 0)
+                    ).where(Task.completed_at != None).group_by(day)
+                )).all()
+            }
+            
+            achievements = {a.date_key: a for a in (await session.exec(select(Achievement))).all()}
+            drifted = []
+            for key in sorted(set(actual) | set(achievements)):
+                counts = actual.get(key, (0, 0, 0))
+                achievement = achievements.get(key)
+                if achievement and (achievement.task_count, achievement.step_count, achievement.consumed_minutes) == counts:
+                    continue
+                
+                drifted.append(key)
+                if not achievement:
+                    achievement = Achievement(date_key=key)
+                achievement.task_count, achievement.step_count, achievement.consumed_minutes = counts
+                achievement.summary_md = await SummaryService._render_daily(session, key)
+                achievement.rendered_version = achievement.summary_version
+                session.add(achievement)
+            
+            # 细分无法逐天比较漂移，全部标记过期，在下次查询统计时重算
+            await session.exec(update(Achievement).values(stats_version=0))
+            await session.commit()
+            return {"days": len(set(actual) | set(achievements)), "drifted": drifted}
 
     @staticmethod
-    def get_achievements(limit: int = 10, offset: int = 0) -> List[Achievement]:
-        """获取成就列表"""
-        with Session(engine) as session:
-            statement = select(Achievement).order_by(Achievement.date_key.desc()).limit(limit).offset(offset)
-            return list(session.exec(statement))
+    async def get_achievements(
+        limit: int = 10,
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Achievement], Optional[str]]:
+        """按日期倒序获取成就列表，返回 (成就, 下一页游标)；传入 cursor 时按日期键集分页，忽略 offset"""
+        statement = select(Achievement).order_by(Achievement.date_key.desc()).limit(limit + 1)
+        if cursor:
+            statement = statement.where(Achievement.date_key < _decode_cursor(cursor))
+        elif offset:
+            statement = statement.offset(offset)
+        
+        async with async_session() as session:
+            achievements = list(await session.exec(statement))
+        
+        next_cursor = None
+        if len(achievements) > limit:
+            achievements = achievements[:limit]
+            next_cursor = _encode_cursor(achievements[-1].date_key)
+        return achievements, next_cursor
 
     @staticmethod
-    def get_achievement(achievement_id: str) -> Optional[Achievement]:
+    async def get_achievement(achievement_id: str) -> Optional[Achievement]:
         """获取单个成就"""
-        with Session(engine) as session:
+        async with async_session() as session:
             statement = select(Achievement).where(Achievement.id == achievement_id)
-            return session.exec(statement).first()
\ No newline at end of file
+            return (await session.exec(statement)).first()
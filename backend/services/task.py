@@ -1,214 +1,376 @@
-from typing import List, Optional, Dict, Any
-from uuid import UUID
-from sqlmodel import Session, select
+import base64
+from collections import defaultdict
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from uuid import UUID, uuid4
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import and_, bindparam, func, insert, or_, update
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 
-from models import Task, Step, engine
-from schemas import TaskCreate, TaskUpdate, StepUpdate
+from models import Task, Step, async_session
+from schemas import TaskCreate, TaskUpdate, StepUpdate, StepCreate, StepBatchItem, TaskBatchItem, TaskResponse
 from services.agent import AgentService
+from services.summary import SummaryService, date_key_for
+from services.changes import ChangeService
+from serializers import step_response, task_list_item, task_response
+
+TASK_FIELDS = (
+    "id", "title", "estimated_minutes", "created_at", "completed_at",
+    "steps", "step_count", "done_count"
+)
+DEFAULT_TASK_FIELDS = ("id", "title", "estimated_minutes", "created_at", "completed_at", "steps")
+
+def _encode_cursor(task: Task) -> str:
+    raw = f"{task.created_at.isoformat()}|{task.id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(hex=task_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _build_enhanced_prompt(
+    title: str,
+    prompt: Optional[str] = None,
+    tools: Optional[List[str]] = None,
+    context: Optional[str] = None,
+    constraints: Optional[str] = None
+) -> str:
+    enhanced_prompt = prompt or title
+    if context:
+        enhanced_prompt = f"任务背景：{context}\n\n{enhanced_prompt}"
+    if constraints:
+        enhanced_prompt = f"{enhanced_prompt}\n\n限制条件：{constraints}"
+    if tools:
+        tools_str = "、".join(tools)
+        enhanced_prompt = f"使用以下工具：{tools_str}\n\n{enhanced_prompt}"
+    return enhanced_prompt
+
+def _row(obj: SQLModel) -> Dict[str, Any]:
+    """模型对象转为表的列值，用于 executemany 批量写入"""
+    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+
+async def _set_step_done(session: AsyncSession, step: Step, done: bool) -> bool:
+    """切换步骤完成状态；所属任务已完成时同步调整当天成就的步骤计数，返回状态是否变化"""
+    if step.done == done:
+        return False
+    step.done = done
+    
+    task = await session.get(Task, step.task_id)
+    if task and task.completed_at:
+        await SummaryService.apply_delta(
+            session,
+            date_key_for(task.completed_at),
+            steps=1 if done else -1
+        )
+    return True
 
 class TaskService:
     @staticmethod
-    def create(title: str) -> Dict[str, Any]:
-        with Session(engine) as session:
-            # Create skeleton task
-            task = Task(title=title)
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-            
-            # Auto-decompose with Agent
-            agent = AgentService()
-            steps_data = agent.suggest_steps(title)
-            total_minutes = agent.estimate_total_duration(steps_data)
-            
-            # Update task with estimated time
-            task.estimated_minutes = total_minutes
-            session.add(task)
-            
-            # Create steps
-            for idx, step_data in enumerate(steps_data):
-                step = Step(
-                    task_id=task.id,
-                    content=step_data["content"],
-                    tool=step_data.get("tool"),
-                    theme=step_data.get("theme"),
-                    deliverable=step_data.get("deliverable"),
-                    estimate_minutes=step_data["estimate_minutes"],
-                    order_idx=idx
-                )
-                session.add(step)
-            
-            session.commit()
-            session.refresh(task)
-            
-            # Load steps
-            steps = session.exec(
-                select(Step).where(Step.task_id == task.id).order_by(Step.order_idx)
-            ).all()
-            
-            # Return dict with steps
-            return {
-                'id': str(task.id),
-                'title': task.title,
-                'estimated_minutes': task.estimated_minutes,
-                'created_at': task.created_at.isoformat(),
-                'completed_at': task.completed_at.isoformat() if task.completed_at else None,
-                'steps': [
-                    {
-                        'id': str(step.id),
-                        'task_id': str(step.task_id),
-                        'content': step.content,
-                        'tool': step.tool,
-                        'theme': step.theme,
-                        'deliverable': step.deliverable,
-                        'estimate_minutes': step.estimate_minutes,
-                        'done': step.done,
-                        'order_idx': step.order_idx
-                    }
-                    for step in steps
-                ]
-            }
+    async def create(title: str) -> TaskResponse:
+        return await TaskService.create_with_ai(title)
 
     @staticmethod
-    def get(task_id: UUID) -> Optional[Task]:
-        with Session(engine) as session:
-            statement = select(Task).where(Task.id == task_id)
-            return session.exec(statement).first()
+    async def get(task_id: UUID) -> Optional[Task]:
+        async with async_session() as session:
+            statement = select(Task).where(Task.id == task_id).options(selectinload(Task.steps))
+            return (await session.exec(statement)).first()
 
     @staticmethod
-    def get_all() -> List[Dict[str, Any]]:
-        with Session(engine) as session:
-            tasks = session.exec(
+    async def get_all() -> List[TaskResponse]:
+        async with async_session() as session:
+            # 一次性预加载所有步骤（按 order_idx 排序），避免逐个任务查询
+            tasks = (await session.exec(
                 select(Task).order_by(Task.created_at.desc())
-            ).all()
-            
-            result = []
-            for task in tasks:
-                steps = session.exec(
-                    select(Step).where(Step.task_id == task.id).order_by(Step.order_idx)
-                ).all()
-                
-                task_dict = {
-                    'id': str(task.id),
-                    'title': task.title,
-                    'estimated_minutes': task.estimated_minutes,
-                    'created_at': task.created_at.isoformat(),
-                    'completed_at': task.completed_at.isoformat() if task.completed_at else None,
-                    'steps': []
-                }
-                
-                for step in steps:
-                    task_dict['steps'].append({
-                        'id': str(step.id),
-                        'task_id': str(step.task_id),
-                        'content': step.content,
-                        'tool': step.tool,
-                        'theme': step.theme,
-                        'deliverable': step.deliverable,
-                        'estimate_minutes': step.estimate_minutes,
-                        'done': step.done,
-                        'order_idx': step.order_idx
-                    })
-                
-                result.append(task_dict)
+                .options(selectinload(Task.steps))
+            )).all()
             
-            return result
+            return [task_response(task, task.steps) for task in tasks]
 
     @staticmethod
-    def update(task_id: UUID, update_data: TaskUpdate) -> Optional[Task]:
-        with Session(engine) as session:
-            statement = select(Task).where(Task.id == task_id)
-            task = session.exec(statement).first()
+    async def update(task_id: UUID, update_data: TaskUpdate) -> Optional[Task]:
+        async with async_session() as session:
+            statement = select(Task).where(Task.id == task_id).options(selectinload(Task.steps))
+            task = (await session.exec(statement)).first()
             if not task:
                 return None
             
-            if update_data.title is not None:
+            changes = []
+            if update_data.title is not None and update_data.title != task.title:
                 task.title = update_data.title
+                # 已完成任务的标题出现在当天总结中
+                if task.completed_at:
+                    await SummaryService.invalidate(session, date_key_for(task.completed_at))
+                changes.append(ChangeService.record(
+                    session, "task", "updated", task.id, task.id, {"title": task.title}
+                ))
             
             session.add(task)
-            session.commit()
-            session.refresh(task)
+            await session.commit()
+            await session.refresh(task)
+            await ChangeService.publish(changes)
             return task
 
     @staticmethod
-    def mark_step_done(step_id: UUID, done: bool = True) -> Optional[Step]:
-        with Session(engine) as session:
+    async def mark_step_done(step_id: UUID, done: bool = True) -> Optional[Step]:
+        async with async_session() as session:
             statement = select(Step).where(Step.id == step_id)
-            step = session.exec(statement).first()
+            step = (await session.exec(statement)).first()
             if not step:
                 return None
             
-            step.done = done
+            changes = []
+            if await _set_step_done(session, step, done):
+                changes.append(ChangeService.record(
+                    session, "step", "updated", step.task_id, step.id, {"done": step.done}
+                ))
             session.add(step)
-            session.commit()
-            session.refresh(step)
+            await session.commit()
+            await session.refresh(step)
+            await ChangeService.publish(changes)
             return step
 
     @staticmethod
-    def update_step(step_id: UUID, update_data: StepUpdate) -> Optional[Step]:
-        with Session(engine) as session:
+    async def update_step(step_id: UUID, update_data: StepUpdate) -> Optional[Step]:
+        async with async_session() as session:
             # Convert UUID to hex string format (without hyphens) for database comparison
             step_id_hex = str(step_id).replace('-', '')
             statement = select(Step).where(Step.id == step_id_hex)
-            step = session.exec(statement).first()
+            step = (await session.exec(statement)).first()
             if not step:
                 return None
             
-            if update_data.done is not None:
-                step.done = update_data.done
-            if update_data.content is not None:
+            delta = {}
+            if update_data.done is not None and await _set_step_done(session, step, update_data.done):
+                delta["done"] = step.done
+            if update_data.content is not None and update_data.content != step.content:
                 step.content = update_data.content
+                delta["content"] = step.content
             
+            changes = []
+            if delta:
+                changes.append(ChangeService.record(session, "step", "updated", step.task_id, step.id, delta))
             session.add(step)
-            session.commit()
-            session.refresh(step)
+            await session.commit()
+            await session.refresh(step)
+            await ChangeService.publish(changes)
             return step
 
     @staticmethod
-    def complete(task_id: UUID) -> Optional[Task]:
-        with Session(engine) as session:
+    async def update_steps_batch(updates: List[StepBatchItem]) -> List[Dict[str, Any]]:
+        """在一个事务中批量更新步骤，按请求顺序返回每一项的结果；同一步骤出现多次时依次应用"""
+        step_table = Step.__table__
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(step_table, Task.completed_at)
+                .join(Task, Task.id == step_table.c.task_id)
+                .where(step_table.c.id.in_({item.id for item in updates}))
+            )).all()
+            # 只读取列值构造游离对象，写入统一通过下面的 executemany 完成
+            current = {
+                row.id: (Step(**{column.name: row._mapping[column] for column in step_table.columns}), row.completed_at)
+                for row in rows
+            }
+            
+            results = []
+            changes = []
+            dirty: Dict[UUID, Step] = {}
+            step_deltas: Dict[str, int] = defaultdict(int)
+            for index, item in enumerate(updates):
+                if item.id not in current:
+                    results.append({"index": index, "id": str(item.id), "status": "not_found"})
+                    continue
+                
+                step, completed_at = current[item.id]
+                delta = {}
+                if item.done is not None and item.done != step.done:
+                    step.done = item.done
+                    delta["done"] = step.done
+                    # 所属任务已完成时同步调整当天成就的步骤计数
+                    if completed_at:
+                        step_deltas[date_key_for(completed_at)] += 1 if step.done else -1
+                if item.content is not None and item.content != step.content:
+                    step.content = item.content
+                    delta["content"] = step.content
+                
+                if delta:
+                    dirty[step.id] = step
+                    changes.append(ChangeService.record(session, "step", "updated", step.task_id, step.id, delta))
+                results.append({
+                    "index": index,
+                    "id": str(step.id),
+                    "status": "updated" if delta else "unchanged",
+                    "step": step
+                })
+            
+            if dirty:
+                await session.execute(
+                    update(step_table)
+                    .where(step_table.c.id == bindparam("step_id"))
+                    .values(done=bindparam("new_done"), content=bindparam("new_content")),
+                    [
+                        {"step_id": step.id, "new_done": step.done, "new_content": step.content}
+                        for step in dirty.values()
+                    ]
+                )
+            for date_key, steps in step_deltas.items():
+                if steps:
+                    await SummaryService.apply_delta(session, date_key, steps=steps)
+            await session.commit()
+        
+        await ChangeService.publish(changes)
+        # 同一步骤出现多次时，每一项都返回最终状态
+        for result in results:
+            if "step" in result:
+                result["step"] = step_response(result["step"])
+        return results
+
+    @staticmethod
+    async def create_batch(items: List[TaskBatchItem], fallback: bool = False) -> List[Dict[str, Any]]:
+        """在一个事务中批量创建任务及其步骤（步骤按列表顺序排列），已存在的任务ID会跳过。
+        需要AI拆解的任务先在事务外并发请求模型，拆解失败的任务报告为 failed"""
+        item_steps: List[List[StepCreate]] = [list(item.steps) for item in items]
+        failures: Dict[int, str] = {}
+        ai_indexes = [index for index, item in enumerate(items) if item.use_ai and not item.steps]
+        if ai_indexes:
+            agent = AgentService()
+            outcomes = await agent.suggest_steps_batch([
+                (
+                    _build_enhanced_prompt(
+                        items[index].title, items[index].prompt, items[index].tools,
+                        items[index].context, items[index].constraints
+                    ),
+                    items[index].max_steps
+                )
+                for index in ai_indexes
+            ])
+            for index, outcome in zip(ai_indexes, outcomes):
+                if isinstance(outcome, BaseException):
+                    if not fallback:
+                        failures[index] = str(outcome) or type(outcome).__name__
+                        continue
+                    outcome = agent._fallback_steps(items[index].title)
+                item_steps[index] = [StepCreate(**step_data) for step_data in outcome]
+        
+        async with async_session() as session:
+            requested = [item.id for item in items if item.id]
+            existing = set()
+            if requested:
+                existing = set((await session.exec(select(Task.id).where(Task.id.in_(requested)))).all())
+            
+            results = []
+            changes = []
+            task_rows = []
+            step_rows = []
+            for index, item in enumerate(items):
+                if index in failures:
+                    results.append({
+                        "index": index,
+                        "id": str(item.id) if item.id else None,
+                        "status": "failed",
+                        "error": failures[index]
+                    })
+                    continue
+                if item.id in existing:
+                    results.append({"index": index, "id": str(item.id), "status": "exists"})
+                    continue
+                
+                task = Task(id=item.id or uuid4(), title=item.title)
+                steps = [
+                    Step(
+                        task_id=task.id,
+                        content=step_data.content,
+                        tool=step_data.tool,
+                        theme=step_data.theme,
+                        deliverable=step_data.deliverable,
+                        estimate_minutes=step_data.estimate_minutes,
+                        order_idx=idx
+                    )
+                    for idx, step_data in enumerate(item_steps[index])
+                ]
+                task.estimated_minutes = sum(step.estimate_minutes for step in steps)
+                existing.add(task.id)
+                
+                task_rows.append(_row(task))
+                step_rows.extend(_row(step) for step in steps)
+                task_data = task_response(task, steps)
+                changes.append(ChangeService.record(session, "task", "created", task.id, task.id, task_data))
+                results.append({"index": index, "id": str(task.id), "status": "created", "task": task_data})
+            
+            if task_rows:
+                await session.execute(insert(Task.__table__), task_rows)
+            if step_rows:
+                await session.execute(insert(Step.__table__), step_rows)
+            await session.commit()
+        
+        await ChangeService.publish(changes)
+        return results
+
+    @staticmethod
+    async def complete(task_id: UUID) -> Optional[Task]:
+        async with async_session() as session:
             statement = select(Task).where(Task.id == task_id)
-            task = session.exec(statement).first()
+            task = (await session.exec(statement)).first()
             if not task:
                 return None
             
+            done_steps = (await session.exec(
+                select(func.count(Step.id)).where(Step.task_id == task.id, Step.done == True)
+            )).one()
+            
+            # 重复完成时先从原来那天的成就中扣除
+            if task.completed_at:
+                await SummaryService.apply_delta(
+                    session,
+                    date_key_for(task.completed_at),
+                    tasks=-1,
+                    steps=-done_steps,
+                    minutes=-task.estimated_minutes
+                )
+            
             task.completed_at = datetime.utcnow()
+            await SummaryService.apply_delta(
+                session,
+                date_key_for(task.completed_at),
+                tasks=1,
+                steps=done_steps,
+                minutes=task.estimated_minutes
+            )
             session.add(task)
-            session.commit()
-            session.refresh(task)
+            change = ChangeService.record(
+                session, "task", "completed", task.id, task.id,
+                {"completed_at": task.completed_at.isoformat()}
+            )
+            await session.commit()
+            await session.refresh(task)
+            await ChangeService.publish([change])
             return task
 
     @staticmethod
-    def create_with_ai(
+    async def create_with_ai(
         title: str, 
         max_steps: int = 9, 
         prompt: Optional[str] = None,
         tools: Optional[List[str]] = None,
         context: Optional[str] = None,
         constraints: Optional[str] = None
-    ) -> Dict[str, Any]:
+    ) -> TaskResponse:
         """使用增强的AI配置创建任务"""
-        with Session(engine) as session:
+        async with async_session() as session:
             # Create skeleton task
             task = Task(title=title)
             session.add(task)
-            session.commit()
-            session.refresh(task)
+            await session.commit()
             
             # Build enhanced prompt
-            enhanced_prompt = prompt or title
-            if context:
-                enhanced_prompt = f"任务背景：{context}\n\n{enhanced_prompt}"
-            if constraints:
-                enhanced_prompt = f"{enhanced_prompt}\n\n限制条件：{constraints}"
-            if tools:
-                tools_str = "、".join(tools)
-                enhanced_prompt = f"使用以下工具：{tools_str}\n\n{enhanced_prompt}"
+            enhanced_prompt = _build_enhanced_prompt(title, prompt, tools, context, constraints)
             
             # Auto-decompose with Agent using enhanced prompt
             agent = AgentService()
-            steps_data = agent.suggest_steps(enhanced_prompt, max_steps=max_steps)
+            steps_data = await agent.suggest_steps(enhanced_prompt, max_steps=max_steps)
             total_minutes = agent.estimate_total_duration(steps_data)
             
             # Update task with estimated time
@@ -216,6 +378,7 @@ class TaskService:
             session.add(task)
             
             # Create steps
+            steps = []
             for idx, step_data in enumerate(steps_data):
                 step = Step(
                     task_id=task.id,
@@ -227,73 +390,141 @@ class TaskService:
                     order_idx=idx
                 )
                 session.add(step)
+                steps.append(step)
             
-            session.commit()
-            session.refresh(task)
-            
-            # Load steps
-            steps = session.exec(
-                select(Step).where(Step.task_id == task.id).order_by(Step.order_idx)
-            ).all()
+            task_data = task_response(task, steps)
+            change = ChangeService.record(session, "task", "created", task.id, task.id, task_data)
+            await session.commit()
+            await ChangeService.publish([change])
+            return task_data
+
+    @staticmethod
+    async def create_streaming(
+        title: str,
+        max_steps: int = 9,
+        prompt: Optional[str] = None,
+        tools: Optional[List[str]] = None,
+        context: Optional[str] = None,
+        constraints: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式创建任务：每解析出一个步骤就立即落库并产出事件"""
+        async with async_session() as session:
+            # Create skeleton task
+            task = Task(title=title)
+            session.add(task)
+            change = ChangeService.record(session, "task", "created", task.id, task.id, task_response(task))
+            await session.commit()
+            await ChangeService.publish([change])
             
-            # Return dict with steps
-            return {
-                'id': str(task.id),
+            yield {
+                'type': 'task_created',
+                'task_id': str(task.id),
                 'title': task.title,
-                'estimated_minutes': task.estimated_minutes,
-                'created_at': task.created_at.isoformat(),
-                'completed_at': task.completed_at.isoformat() if task.completed_at else None,
-                'steps': [
-                    {
-                        'id': str(step.id),
-                        'task_id': str(step.task_id),
-                        'content': step.content,
-                        'tool': step.tool,
-                        'theme': step.theme,
-                        'deliverable': step.deliverable,
-                        'estimate_minutes': step.estimate_minutes,
-                        'done': step.done,
-                        'order_idx': step.order_idx
-                    }
-                    for step in steps
+                'created_at': task.created_at.isoformat()
+            }
+            
+            enhanced_prompt = _build_enhanced_prompt(title, prompt, tools, context, constraints)
+            agent = AgentService()
+            
+            idx = 0
+            async for step_data in agent.stream_steps(enhanced_prompt, max_steps=max_steps):
+                step = Step(
+                    task_id=task.id,
+                    content=step_data["content"],
+                    tool=step_data.get("tool"),
+                    theme=step_data.get("theme"),
+                    deliverable=step_data.get("deliverable"),
+                    estimate_minutes=step_data["estimate_minutes"],
+                    order_idx=idx
+                )
+                task.estimated_minutes += step.estimate_minutes
+                session.add(step)
+                session.add(task)
+                step_data = step_response(step)
+                changes = [
+                    ChangeService.record(session, "step", "created", task.id, step.id, step_data),
+                    ChangeService.record(
+                        session, "task", "updated", task.id, task.id,
+                        {"estimated_minutes": task.estimated_minutes}
+                    )
                 ]
+                await session.commit()
+                await ChangeService.publish(changes)
+                idx += 1
+                
+                yield {
+                    'type': 'step_created',
+                    'task_id': str(task.id),
+                    'step': step_data
+                }
+            
+            yield {
+                'type': 'task_ready',
+                'task_id': str(task.id),
+                'estimated_minutes': task.estimated_minutes,
+                'step_count': idx
             }
 
     @staticmethod
-    def get_incomplete_tasks() -> List[Dict[str, Any]]:
-        with Session(engine) as session:
-            tasks = session.exec(
-                select(Task).where(Task.completed_at == None).order_by(Task.created_at.desc())
-            ).all()
+    async def get_incomplete_tasks() -> List[Dict[str, Any]]:
+        tasks, _ = await TaskService.get_incomplete_page()
+        return tasks
+
+    @staticmethod
+    async def get_incomplete_page(
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按 (created_at, id) 游标分页获取未完成任务，并只返回请求的字段"""
+        fields = list(fields or DEFAULT_TASK_FIELDS)
+        unknown = [f for f in fields if f not in TASK_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        
+        # 步骤数量通过关联子查询在同一条 SQL 中计算，无需加载步骤
+        with_counts = "step_count" in fields or "done_count" in fields
+        if with_counts:
+            step_count = select(func.count(Step.id)).where(Step.task_id == Task.id).scalar_subquery()
+            done_count = select(func.count(Step.id)).where(Step.task_id == Task.id, Step.done == True).scalar_subquery()
+            statement = select(Task, step_count, done_count)
+        else:
+            statement = select(Task)
+        
+        statement = statement.where(Task.completed_at == None)
+        if cursor:
+            cursor_created_at, cursor_id = _decode_cursor(cursor)
+            statement = statement.where(or_(
+                Task.created_at < cursor_created_at,
+                and_(Task.created_at == cursor_created_at, Task.id < cursor_id)
+            ))
+        if "steps" in fields:
+            statement = statement.options(selectinload(Task.steps))
+        
+        statement = statement.order_by(Task.created_at.desc(), Task.id.desc())
+        if limit:
+            # 多取一条用于判断是否还有下一页
+            statement = statement.limit(limit + 1)
+        
+        async with async_session() as session:
+            rows = (await session.exec(statement)).all()
+            
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1][0] if with_counts else rows[-1]
+                next_cursor = _encode_cursor(last)
             
+            field_set = set(fields)
             result = []
-            for task in tasks:
-                steps = session.exec(
-                    select(Step).where(Step.task_id == task.id).order_by(Step.order_idx)
-                ).all()
-                
-                task_dict = {
-                    'id': str(task.id),
-                    'title': task.title,
-                    'estimated_minutes': task.estimated_minutes,
-                    'created_at': task.created_at.isoformat(),
-                    'completed_at': task.completed_at.isoformat() if task.completed_at else None,
-                    'steps': []
-                }
-                
-                for step in steps:
-                    task_dict['steps'].append({
-                        'id': str(step.id),
-                        'task_id': str(step.task_id),
-                        'content': step.content,
-                        'tool': step.tool,
-                        'theme': step.theme,
-                        'deliverable': step.deliverable,
-                        'estimate_minutes': step.estimate_minutes,
-                        'done': step.done,
-                        'order_idx': step.order_idx
-                    })
-                
-                result.append(task_dict)
+            for row in rows:
+                task, counts = (row[0], row[1:]) if with_counts else (row, (0, 0))
+                item = task_list_item(
+                    task,
+                    task.steps if "steps" in fields else (),
+                    step_count=counts[0],
+                    done_count=counts[1]
+                )
+                result.append(item.model_dump(include=field_set))
             
-            return result
\ No newline at end of file
+            return result, next_cursor
@@ -0,0 +1,283 @@
+import io
+import os
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple, Type, Union, get_args
+from uuid import UUID
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Achievement, Step, Task, async_session
+from schemas import StepImport, StepResponse, TaskImport, TaskResponse
+from serializers import dumps
+from services.changes import ChangeService
+from services.summary import SummaryService, date_key_for
+from job_queue import job_queue
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖，未安装时只支持 NDJSON
+    pa = None
+    pq = None
+
+# 导出时每次查询的行数，也是 Arrow 记录批/Parquet 行组的大小
+EXPORT_BATCH_SIZE = int(os.getenv("TASKAGENT_EXPORT_BATCH_SIZE", "1000"))
+# 导入时每个事务写入的行数
+IMPORT_BATCH_SIZE = int(os.getenv("TASKAGENT_IMPORT_BATCH_SIZE", "1000"))
+# 导入结果中最多列出的错误行
+MAX_IMPORT_ERRORS = 100
+# Parquet 需要从文件尾读取元数据，上传的 Arrow/Parquet 先写入临时文件，超过该大小才落盘
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# 可导出的表：模型、键集分页的列、导出的列
+EXPORTS: Dict[str, Tuple[Type[SQLModel], str, Tuple[str, ...]]] = {
+    "tasks": (Task, "id", ("id", "title", "estimated_minutes", "created_at", "completed_at")),
+    "steps": (
+        Step, "id",
+        ("id", "task_id", "content", "tool", "theme", "deliverable", "estimate_minutes", "done", "order_idx")
+    ),
+    "achievements": (
+        Achievement, "date_key",
+        ("id", "date_key", "task_count", "step_count", "consumed_minutes", "summary_md")
+    ),
+}
+IMPORTS: Dict[str, Type[BaseModel]] = {"tasks": TaskImport, "steps": StepImport}
+
+Row = Tuple[int, Union[Dict[str, Any], Exception]]
+
+def _arrow_schema(entity: str) -> "pa.Schema":
+    """按模型字段的类型生成 Arrow 结构，UUID 导出为字符串"""
+    model, _, fields = EXPORTS[entity]
+    types = {UUID: pa.string(), str: pa.string(), int: pa.int64(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+    columns = []
+    for name in fields:
+        annotation = model.model_fields[name].annotation
+        # Optional[X] 取 X
+        annotation = next((arg for arg in get_args(annotation) if arg is not type(None)), annotation)
+        columns.append(pa.field(name, types[annotation]))
+    return pa.schema(columns)
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in error.errors())
+    return str(error) or type(error).__name__
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """按行解析 NDJSON，只缓存未读完的一行；解析失败的行交给调用方记录"""
+    buffer = b""
+    line_no = 0
+
+    def parse(line: bytes) -> Union[Dict[str, Any], Exception]:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            return ValueError(f"Invalid JSON: {e}")
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, parse(line)
+    if buffer.strip():
+        yield line_no + 1, parse(buffer)
+
+async def _file_rows(chunks: AsyncIterator[bytes], format: str) -> AsyncIterator[Row]:
+    """Arrow 流或 Parquet 文件按记录批读取，内存占用只与批大小有关"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        async for chunk in chunks:
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            if format == "arrow":
+                batches = iter(pa.ipc.open_stream(spool))
+            else:
+                batches = pq.ParquetFile(spool).iter_batches(batch_size=IMPORT_BATCH_SIZE)
+        except pa.ArrowException as e:
+            raise ValueError(f"Invalid {format} file: {e}")
+
+        line_no = 0
+        for batch in batches:
+            for row in batch.to_pylist():
+                line_no += 1
+                yield line_no, row
+
+async def _insert_tasks(session: AsyncSession, batch: List[Tuple[int, TaskImport]], result: Dict[str, Any]):
+    requested = [item.id for _, item in batch]
+    existing = set((await session.exec(select(Task.id).where(Task.id.in_(requested)))).all())
+
+    rows = []
+    changes = []
+    # 日期 -> [任务数, 预估时间]；导入的任务还没有步骤，步骤计数在导入步骤时累加
+    deltas: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for _, item in batch:
+        if item.id in existing:
+            result["existing"] += 1
+            continue
+        existing.add(item.id)
+        row = item.model_dump()
+        rows.append(row)
+        changes.append(("task", "created", item.id, item.id, TaskResponse(**row)))
+        if item.completed_at:
+            delta = deltas[date_key_for(item.completed_at)]
+            delta[0] += 1
+            delta[1] += item.estimated_minutes
+
+    if rows:
+        await session.execute(insert(Task.__table__), rows)
+    await ChangeService.record_many(session, changes)
+    await SummaryService.apply_deltas(session, {
+        date_key: (tasks, 0, minutes) for date_key, (tasks, minutes) in deltas.items()
+    })
+    result["imported"] += len(rows)
+
+async def _insert_steps(session: AsyncSession, batch: List[Tuple[int, StepImport]], result: Dict[str, Any]):
+    task_ids = list({item.task_id for _, item in batch})
+    completed = dict((await session.exec(
+        select(Task.id, Task.completed_at).where(Task.id.in_(task_ids))
+    )).all())
+    existing = set((await session.exec(
+        select(Step.id).where(Step.id.in_([item.id for _, item in batch]))
+    )).all())
+
+    rows = []
+    changes = []
+    step_deltas: Dict[str, int] = defaultdict(int)
+    for line_no, item in batch:
+        if item.id in existing:
+            result["existing"] += 1
+            continue
+        if item.task_id not in completed:
+            _record_error(result, line_no, "Task not found")
+            continue
+        existing.add(item.id)
+        row = item.model_dump()
+        rows.append(row)
+        changes.append(("step", "created", item.task_id, item.id, StepResponse(**row)))
+        # 所属任务已完成时，已完成的步骤计入当天成就
+        if item.done and completed[item.task_id]:
+            step_deltas[date_key_for(completed[item.task_id])] += 1
+
+    if rows:
+        await session.execute(insert(Step.__table__), rows)
+    await ChangeService.record_many(session, changes)
+    await SummaryService.apply_deltas(session, {date_key: (0, steps, 0) for date_key, steps in step_deltas.items()})
+    result["imported"] += len(rows)
+
+def _record_error(result: Dict[str, Any], line_no: int, message: str):
+    result["failed"] += 1
+    if len(result["errors"]) < MAX_IMPORT_ERRORS:
+        result["errors"].append({"line": line_no, "error": message})
+
+class TransferService:
+    @staticmethod
+    def check_format(format: str):
+        """在开始流式响应之前检查格式，之后就无法再返回错误状态码"""
+        if format not in MEDIA_TYPES:
+            raise ValueError(f"Unknown format: {format}")
+        if format != "ndjson" and pa is None:
+            raise ValueError(f"Format {format} requires pyarrow")
+
+    @staticmethod
+    async def _batches(entity: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按键集分页逐批读取；每批使用独立的短事务，不会长时间占用读快照"""
+        model, key, fields = EXPORTS[entity]
+        table = model.__table__
+        key_column = table.c[key]
+        statement = select(*(table.c[name] for name in fields)).order_by(key_column).limit(EXPORT_BATCH_SIZE)
+        last = None
+        while True:
+            async with async_session() as session:
+                rows = (await session.execute(
+                    statement if last is None else statement.where(key_column > last)
+                )).all()
+            if not rows:
+                return
+            yield [dict(row._mapping) for row in rows]
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            last = rows[-1]._mapping[key]
+
+    @staticmethod
+    async def export_stream(entity: str, format: str = "ndjson") -> AsyncIterator[bytes]:
+        """逐批生成导出内容，每批查询后立即写出，整表不会同时驻留内存"""
+        TransferService.check_format(format)
+        if entity not in EXPORTS:
+            raise ValueError(f"Unknown entity: {entity}")
+
+        if format == "ndjson":
+            async for rows in TransferService._batches(entity):
+                yield b"".join(dumps(row) + b"\n" for row in rows)
+            return
+
+        schema = _arrow_schema(entity)
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema) if format == "arrow" else pq.ParquetWriter(sink, schema)
+        async for rows in TransferService._batches(entity):
+            for row in rows:
+                for name, value in row.items():
+                    if isinstance(value, UUID):
+                        row[name] = str(value)
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+            yield _drain(sink)
+        # Parquet 的元数据在关闭时写入文件尾
+        writer.close()
+        yield _drain(sink)
+
+    @staticmethod
+    async def import_stream(entity: str, chunks: AsyncIterator[bytes], format: str = "ndjson") -> Dict[str, Any]:
+        """校验并导入导出格式的任务或步骤（步骤所属任务须已存在，先导入任务再导入步骤）。
+        每 IMPORT_BATCH_SIZE 行一个事务；已存在的ID跳过，中断后重新导入同一文件不会重复写入"""
+        TransferService.check_format(format)
+        if entity not in IMPORTS:
+            raise ValueError(f"Unknown entity: {entity}")
+        schema = IMPORTS[entity]
+        insert_batch = _insert_tasks if entity == "tasks" else _insert_steps
+        rows = _ndjson_rows(chunks) if format == "ndjson" else _file_rows(chunks, format)
+
+        result: Dict[str, Any] = {"entity": entity, "imported": 0, "existing": 0, "failed": 0, "errors": []}
+        batch = []
+
+        async def flush():
+            # 大批量导入只写入变更日志而不实时推送，客户端发现序号跳跃后通过 since 接口补齐
+            async with async_session() as session:
+                await insert_batch(session, batch, result)
+                await session.commit()
+            batch.clear()
+
+        async for line_no, data in rows:
+            try:
+                if isinstance(data, Exception):
+                    raise data
+                batch.append((line_no, schema.model_validate(data)))
+            except ValueError as e:
+                _record_error(result, line_no, _error_message(e))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+        if batch:
+            await flush()
+
+        if result["imported"]:
+            job_queue.submit("changes:prune", ChangeService.prune)
+        return result
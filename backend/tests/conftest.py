@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest_asyncio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 测试使用独立的临时数据库，必须在导入应用模块之前设置
+os.environ["TASKAGENT_DB_PATH"] = str(Path(tempfile.mkdtemp(prefix="taskagent-test-")) / "test.db")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+@pytest_asyncio.fixture
+async def db():
+    from models import create_db_and_tables
+    from migrations import run_migrations
+
+    await create_db_and_tables()
+    await run_migrations()
+    yield
+    # 后台任务队列在首次提交时绑定到当前测试的事件循环，执行完已提交的任务后停止
+    from job_queue import job_queue
+
+    await job_queue.stop()
+
+    # 各测试共用一个数据库文件，结束后清空数据（搜索索引由触发器同步清理）
+    from sqlmodel import SQLModel
+    from models import async_engine
+
+    async with async_engine.begin() as conn:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            await conn.execute(table.delete())
@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.agent import AgentService
+
+class _Response:
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+class _Stream:
+    """模拟 OpenAI 流式响应：每个分块是一行步骤"""
+
+    def __init__(self):
+        self.response = _Response()
+
+    async def __aiter__(self):
+        for i in range(1, 10):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"第{i}步：步骤{i}\n"))])
+            await asyncio.sleep(0)
+
+def _agent(stream: _Stream) -> AgentService:
+    async def create(**kwargs):
+        return stream
+
+    agent = AgentService()
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return agent
+
+@pytest.mark.asyncio
+async def test_stream_steps_closes_upstream_when_client_disconnects(db):
+    stream = _Stream()
+    steps = _agent(stream).stream_steps("断开连接的任务")
+    assert (await steps.__anext__())["content"] == "步骤1"
+    await steps.aclose()
+    assert stream.response.closed
+
+@pytest.mark.asyncio
+async def test_stream_steps_closes_upstream_at_max_steps(db):
+    stream = _Stream()
+    steps = [step async for step in _agent(stream).stream_steps("达到上限的任务", max_steps=3)]
+    assert [step["content"] for step in steps] == ["步骤1", "步骤2", "步骤3"]
+    assert stream.response.closed
@@ -0,0 +1,63 @@
+import pytest
+from sqlmodel import select
+
+from models import BackfillCheckpoint, Step, Task, async_session
+from services.backfill import RECLASSIFY_JOB, BackfillService
+
+class _Interrupted(Exception):
+    pass
+
+async def _create_tasks(count: int):
+    async with async_session() as session:
+        for i in range(count):
+            task = Task(title=f"回填任务{i}", estimated_minutes=2)
+            session.add(task)
+            await session.flush()
+            for order_idx, content in enumerate(("开发代码", "测试功能")):
+                session.add(Step(
+                    task_id=task.id, content=content, order_idx=order_idx,
+                    tool="旧工具", theme="旧主题", deliverable="旧交付物", estimate_minutes=1
+                ))
+        await session.commit()
+
+async def _reclassified_tasks():
+    async with async_session() as session:
+        steps = (await session.exec(select(Step).where(Step.tool != "旧工具"))).all()
+        return {step.task_id for step in steps}
+
+@pytest.mark.asyncio
+async def test_reclassify_resumes_from_checkpoint(db):
+    await _create_tasks(5)
+
+    def interrupt(stats):
+        raise _Interrupted()
+
+    # 第一批（2个任务）提交后中断，断点与这批数据一起保存
+    with pytest.raises(_Interrupted):
+        await BackfillService.reclassify_steps(batch_size=2, progress=interrupt)
+    async with async_session() as session:
+        checkpoint = await session.get(BackfillCheckpoint, RECLASSIFY_JOB)
+        assert (checkpoint.processed, checkpoint.changed) == (4, 4)
+    assert len(await _reclassified_tasks()) == 2
+
+    # 再次运行只处理剩下的任务，完成后删除断点
+    stats = await BackfillService.reclassify_steps(batch_size=2)
+    assert stats == {"tasks": 3, "steps": 6, "changed_steps": 6, "changed_tasks": 3}
+    async with async_session() as session:
+        assert await session.get(BackfillCheckpoint, RECLASSIFY_JOB) is None
+        steps = (await session.exec(select(Step).order_by(Step.task_id, Step.order_idx))).all()
+        tasks = (await session.exec(select(Task))).all()
+    assert {(step.content, step.tool, step.theme, step.deliverable) for step in steps} == {
+        ("开发代码", "IDE/代码编辑器", "规划", "代码/功能"),
+        ("测试功能", "测试工具", "验证", "代码/功能"),
+    }
+    assert {task.estimated_minutes for task in tasks} == {60}
+
+@pytest.mark.asyncio
+async def test_reclassify_dry_run_writes_nothing(db):
+    await _create_tasks(3)
+    stats = await BackfillService.reclassify_steps(batch_size=2, dry_run=True)
+    assert stats == {"tasks": 3, "steps": 6, "changed_steps": 6, "changed_tasks": 3}
+    assert await _reclassified_tasks() == set()
+    async with async_session() as session:
+        assert await session.get(BackfillCheckpoint, RECLASSIFY_JOB) is None
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func
+from sqlmodel import select
+
+from event_bus import SQLiteEventBus
+from models import BusEvent, async_session
+
+async def _wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timed out waiting for event")
+        await asyncio.sleep(0.01)
+
+async def _start(bus: SQLiteEventBus) -> list:
+    received = []
+
+    async def deliver(text, topics, coalesce_key):
+        received.append((text, topics, coalesce_key))
+
+    await bus.start(deliver)
+    return received
+
+@pytest.mark.asyncio
+async def test_sqlite_bus_delivers_to_other_workers_only(db):
+    a, b = SQLiteEventBus(poll_interval=0.01), SQLiteEventBus(poll_interval=0.01)
+    received_a, received_b = await _start(a), await _start(b)
+    try:
+        await a.publish("hello", ["task:1"], "delta:step:1")
+        await a.publish("everyone")
+        await _wait_for(lambda: len(received_b) == 2)
+        assert received_b == [("hello", ["task:1"], "delta:step:1"), ("everyone", None, None)]
+        # 发布方的连接由 ConnectionManager 直接投递，总线不再回送
+        await asyncio.sleep(0.05)
+        assert received_a == []
+    finally:
+        await a.stop()
+        await b.stop()
+
+@pytest.mark.asyncio
+async def test_sqlite_bus_ids_keep_increasing_after_prune(db):
+    a, b = SQLiteEventBus(poll_interval=0.01), SQLiteEventBus(poll_interval=0.01)
+    await _start(a)
+    received_b = await _start(b)
+    try:
+        await a.publish("before")
+        await _wait_for(lambda: len(received_b) == 1)
+        last_id = b.last_id
+
+        # 空闲超过保留时间后清理会删除全部事件
+        a.retention_seconds = 0
+        await a._prune()
+        async with async_session() as session:
+            assert (await session.exec(select(func.count(BusEvent.id)))).one() == 0
+
+        await a.publish("after")
+        await _wait_for(lambda: len(received_b) == 2)
+        assert received_b[-1][0] == "after"
+        assert b.last_id > last_id
+    finally:
+        await a.stop()
+        await b.stop()
+
+@pytest.mark.asyncio
+async def test_sqlite_bus_publish_many_keeps_order(db):
+    a, b = SQLiteEventBus(poll_interval=0.01), SQLiteEventBus(poll_interval=0.01)
+    await _start(a)
+    received_b = await _start(b)
+    try:
+        events = [(f"delta {i}", ["event:delta", "task:1"], None) for i in range(5)]
+        await a.publish_many(events)
+        await a.publish_many([])
+        await _wait_for(lambda: len(received_b) == 5)
+        assert received_b == events
+    finally:
+        await a.stop()
+        await b.stop()
@@ -0,0 +1,18 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from metrics import DB_QUERY_ERRORS
+from models import async_engine
+
+@pytest.mark.asyncio
+async def test_failed_statement_does_not_leak_start_time(db):
+    before = DB_QUERY_ERRORS._values.get(("SELECT",), 0)
+    async with async_engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            await conn.execute(text("SELECT * FROM missing_table"))
+        await conn.rollback()
+        assert not (await conn.get_raw_connection()).info.get("query_started")
+        await conn.execute(text("SELECT 1"))
+        assert not (await conn.get_raw_connection()).info.get("query_started")
+    assert DB_QUERY_ERRORS._values.get(("SELECT",), 0) == before + 1
@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import text
+
+from models import Step, Task, async_engine, async_session
+from services.search import SearchService
+from services.task import TaskService
+
+async def _create(title: str, steps=()) -> Task:
+    async with async_session() as session:
+        task = Task(title=title)
+        session.add(task)
+        await session.flush()
+        for i, content in enumerate(steps):
+            session.add(Step(task_id=task.id, content=content, order_idx=i))
+        await session.commit()
+        await session.refresh(task)
+        return task
+
+async def _titles(query: str):
+    results, _ = await SearchService.search_tasks(query)
+    return sorted(result["title"] for result in results)
+
+@pytest.mark.asyncio
+async def test_short_chinese_terms_use_the_index(db):
+    await _create("整理会议纪要", ["收集资料", "撰写初稿"])
+    await _create("准备周报", ["汇总数据"])
+
+    assert await _titles("纪要") == ["整理会议纪要"]
+    assert await _titles("初稿") == ["整理会议纪要"]
+    assert await _titles("报") == ["准备周报"]
+    assert await _titles("会议纪要") == ["整理会议纪要"]
+    # 两个片段都在，但不相邻
+    assert await _titles("整议") == []
+
+    async with async_engine.connect() as conn:
+        plan = (await conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT r.id FROM task_search "
+            "JOIN task_search_rows r ON r.key = task_search.rowid WHERE task_search MATCH '\"纪要\"'"
+        ))).all()
+    assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+@pytest.mark.asyncio
+async def test_index_follows_updates_and_survives_rowid_changes(db):
+    keep = await _create("保留的任务")
+    removed = await _create("删除的任务")
+    await _create("改名前的标题")
+
+    async with async_session() as session:
+        await session.delete(await session.get(Task, removed.id))
+        task = (await session.exec(text("SELECT id FROM tasks WHERE title = '改名前的标题'"))).one()
+        await session.exec(text("UPDATE tasks SET title = '改名后的标题' WHERE id = :id").bindparams(id=task[0]))
+        await session.commit()
+    # 模拟 VACUUM 给没有 INTEGER PRIMARY KEY 的表重新分配 rowid（不会触发任何触发器）
+    async with async_engine.begin() as conn:
+        await conn.execute(text("UPDATE tasks SET rowid = rowid + 1000"))
+        await conn.execute(text("UPDATE steps SET rowid = rowid + 1000"))
+
+    assert await _titles("任务") == ["保留的任务"]
+    assert await _titles("改名前") == []
+    assert await _titles("改名后") == ["改名后的标题"]
+    results, _ = await SearchService.search_tasks("保留")
+    assert [result["id"] for result in results] == [keep.id]
+
+@pytest.mark.asyncio
+async def test_punctuation_terms_fall_back_to_substring_scan(db):
+    await _create("发布 v1.2 版本")
+    assert await _titles("v1.2") == ["发布 v1.2 版本"]
+    assert await _titles("--") == []
+
+@pytest.mark.asyncio
+async def test_ranking_prefers_title_matches_and_pages_by_cursor(db):
+    both = await _create("部署上线", ["部署检查"])
+    await _create("部署脚本", ["编写脚本"])
+    await _create("其他任务", ["部署服务器"])
+    await _create("无关任务", ["整理文档"])
+
+    results, cursor = await SearchService.search_tasks("部署")
+    assert [result["title"] for result in results] == ["部署上线", "部署脚本", "其他任务"]
+    assert cursor is None
+    assert results[0]["title_highlight"] == "<mark>部署</mark>上线"
+    assert results[2]["snippet"] == "<mark>部署</mark>服务器"
+
+    # 逐页读取的结果与一次读取相同，没有重复和遗漏
+    paged, cursor = [], None
+    while True:
+        page, cursor = await SearchService.search_tasks("部署", limit=1, cursor=cursor)
+        paged.extend(result["title"] for result in page)
+        if cursor is None:
+            break
+    assert paged == [result["title"] for result in results]
+
+    # 每个词都要在标题或某个步骤中出现
+    assert await _titles("部署 检查") == ["部署上线"]
+
+    await TaskService.complete(both.id)
+    results, _ = await SearchService.search_tasks("部署", status="open")
+    assert [result["title"] for result in results] == ["部署脚本", "其他任务"]
+    results, _ = await SearchService.search_tasks("部署", status="completed")
+    assert [result["title"] for result in results] == ["部署上线"]
+
+    with pytest.raises(ValueError):
+        await SearchService.search_tasks("部署", cursor="not-a-cursor")
@@ -0,0 +1,77 @@
+from datetime import date, datetime
+from uuid import uuid4
+
+import orjson
+import pytest
+
+from services.stats import StatsService
+from services.task import TaskService
+from services.transfer import TransferService
+
+async def _ndjson(rows):
+    yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+async def _import(tasks, steps):
+    for entity, rows in (("tasks", tasks), ("steps", steps)):
+        result = await TransferService.import_stream(entity, _ndjson(rows))
+        assert result["failed"] == 0, result["errors"]
+
+def _task(completed_at: datetime, minutes: int) -> dict:
+    return {"id": str(uuid4()), "title": "统计测试", "estimated_minutes": minutes, "completed_at": completed_at.isoformat()}
+
+def _step(task: dict, theme: str, tool: str, minutes: int, done: bool = True) -> dict:
+    return {
+        "id": str(uuid4()), "task_id": task["id"], "content": theme, "theme": theme, "tool": tool,
+        "estimate_minutes": minutes, "done": done
+    }
+
+@pytest.mark.asyncio
+async def test_range_stats_buckets_and_breakdown(db):
+    # 2024-01-01 是周一，1日和3日在同一周
+    monday, wednesday, february = (
+        _task(datetime(2024, 1, 1, 9), 30), _task(datetime(2024, 1, 3, 9), 20), _task(datetime(2024, 2, 10, 9), 10)
+    )
+    await _import([monday, wednesday, february], [
+        _step(monday, "规划", "笔记", 10),
+        _step(monday, "执行", "编辑器", 20),
+        _step(wednesday, "执行", "编辑器", 5),
+        _step(wednesday, "执行", "编辑器", 15, done=False),
+        _step(february, "复盘", "笔记", 10),
+    ])
+
+    days = await StatsService.range_stats(date(2024, 1, 1), date(2024, 2, 29), "day")
+    assert [bucket["key"] for bucket in days["buckets"]] == ["2024-01-01", "2024-01-03", "2024-02-10"]
+    assert days["totals"]["tasks"] == 3
+    assert days["totals"]["steps"] == 4
+    assert days["totals"]["minutes"] == 60
+    assert days["totals"]["themes"] == {
+        "规划": {"steps": 1, "minutes": 10}, "执行": {"steps": 2, "minutes": 25}, "复盘": {"steps": 1, "minutes": 10}
+    }
+
+    weeks = await StatsService.range_stats(date(2024, 1, 1), date(2024, 2, 29), "week")
+    assert [(bucket["key"], bucket["tasks"]) for bucket in weeks["buckets"]] == [("2024-01-01", 2), ("2024-02-05", 1)]
+    assert weeks["buckets"][0]["tools"] == {"笔记": {"steps": 1, "minutes": 10}, "编辑器": {"steps": 2, "minutes": 25}}
+
+    months = await StatsService.range_stats(date(2024, 1, 1), date(2024, 12, 31), "month", breakdown=False)
+    assert [(bucket["key"], bucket["steps"]) for bucket in months["buckets"]] == [("2024-01", 3), ("2024-02", 1)]
+    assert "themes" not in months["buckets"][0]
+
+    with pytest.raises(ValueError):
+        await StatsService.range_stats(date(2024, 2, 1), date(2024, 1, 1))
+
+@pytest.mark.asyncio
+async def test_breakdown_is_refreshed_after_steps_change(db):
+    task = _task(datetime(2024, 3, 5, 9), 30)
+    first, second = _step(task, "执行", "编辑器", 10), _step(task, "测试", "浏览器", 20, done=False)
+    await _import([task], [first, second])
+
+    stats = await StatsService.range_stats(date(2024, 3, 5), date(2024, 3, 5))
+    assert stats["totals"]["themes"] == {"执行": {"steps": 1, "minutes": 10}}
+
+    # 已完成任务的步骤状态变化会使当天的细分过期，下次查询时重算
+    await TaskService.mark_step_done(second["id"], True)
+    await TaskService.mark_step_done(first["id"], False)
+    stats = await StatsService.range_stats(date(2024, 3, 5), date(2024, 3, 5))
+    assert stats["totals"]["steps"] == 1
+    assert stats["totals"]["themes"] == {"测试": {"steps": 1, "minutes": 20}}
+    assert stats["totals"]["tools"] == {"浏览器": {"steps": 1, "minutes": 20}}
@@ -0,0 +1,81 @@
+import io
+from datetime import datetime
+from uuid import uuid4
+
+import orjson
+import pyarrow.parquet as pq
+import pytest
+from sqlmodel import select
+
+from models import Task, async_session
+from services.transfer import TransferService
+
+async def _collect(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+async def _chunks(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+@pytest.mark.asyncio
+async def test_parquet_export_round_trip(db):
+    task = Task(title="导出测试", estimated_minutes=25, completed_at=datetime(2024, 3, 1, 9, 30))
+    async with async_session() as session:
+        session.add(task)
+        await session.commit()
+        await session.refresh(task)
+
+    data = await _collect(TransferService.export_stream("tasks", "parquet"))
+    rows = {row["id"]: row for row in pq.read_table(io.BytesIO(data)).to_pylist()}
+    assert rows[str(task.id)]["title"] == "导出测试"
+    assert rows[str(task.id)]["completed_at"] == datetime(2024, 3, 1, 9, 30)
+
+    async with async_session() as session:
+        await session.delete(await session.get(Task, task.id))
+        await session.commit()
+
+    result = await TransferService.import_stream("tasks", _chunks(data, 1024), "parquet")
+    assert result["imported"] == 1
+    assert result["existing"] == len(rows) - 1
+    assert result["failed"] == 0
+    async with async_session() as session:
+        restored = (await session.exec(select(Task).where(Task.id == task.id))).one()
+    assert (restored.title, restored.estimated_minutes) == ("导出测试", 25)
+
+@pytest.mark.asyncio
+async def test_ndjson_import_round_trip_skips_duplicates(db):
+    completed = {"id": str(uuid4()), "title": "已完成", "estimated_minutes": 40, "completed_at": "2024-05-02T10:00:00"}
+    open_task = {"id": str(uuid4()), "title": "进行中", "estimated_minutes": 15}
+    steps = [
+        {"id": str(uuid4()), "task_id": completed["id"], "content": "第一步", "done": True, "order_idx": 0},
+        {"id": str(uuid4()), "task_id": completed["id"], "content": "第二步", "done": False, "order_idx": 1},
+        {"id": str(uuid4()), "task_id": open_task["id"], "content": "第三步", "done": True, "order_idx": 0},
+    ]
+    task_lines = b"".join(orjson.dumps(row) + b"\n" for row in (completed, open_task))
+    step_lines = (
+        b"".join(orjson.dumps(row) + b"\n" for row in steps)
+        + b"{not json\n"
+        + orjson.dumps({"id": str(uuid4()), "task_id": str(uuid4()), "content": "孤立步骤"})
+    )
+
+    result = await TransferService.import_stream("tasks", _chunks(task_lines))
+    assert (result["imported"], result["existing"], result["failed"]) == (2, 0, 0)
+    result = await TransferService.import_stream("steps", _chunks(step_lines))
+    assert (result["imported"], result["existing"], result["failed"]) == (3, 0, 2)
+    assert [error["line"] for error in result["errors"]] == [4, 5]
+    assert result["errors"][1]["error"] == "Task not found"
+
+    # 重新导入同一文件：已存在的ID全部跳过，成就不会重复累加
+    result = await TransferService.import_stream("tasks", _chunks(task_lines))
+    assert (result["imported"], result["existing"]) == (0, 2)
+    result = await TransferService.import_stream("steps", _chunks(step_lines))
+    assert (result["imported"], result["existing"]) == (0, 3)
+
+    exported = [orjson.loads(line) for line in (await _collect(TransferService.export_stream("steps"))).splitlines()]
+    assert sorted((row["id"], row["content"], row["done"]) for row in exported) == sorted(
+        (row["id"], row["content"], row["done"]) for row in steps
+    )
+    exported = [orjson.loads(line) for line in (await _collect(TransferService.export_stream("achievements"))).splitlines()]
+    assert [(row["date_key"], row["task_count"], row["step_count"], row["consumed_minutes"]) for row in exported] == [
+        ("2024-05-02", 1, 1, 40)
+    ]
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+from event_bus import LocalEventBus
+from websocket_manager import ClientConnection, ConnectionManager, delta_coalesce_key, event_topic
+
+class _BlockingSocket:
+    """第一条消息发送时阻塞，直到测试放行，用于在发送队列中积压消息"""
+
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if not self.sent:
+            self.sent.append(json.loads(text))
+            await self.release.wait()
+            return
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+def _delta(seq: int, entity: str, entity_id: str, data: dict) -> dict:
+    return {"type": "delta", "seq": seq, "entity": entity, "op": "updated", "task_id": "t", "id": entity_id, "data": data}
+
+@pytest.mark.asyncio
+async def test_queued_step_deltas_are_coalesced_per_step_and_fields():
+    manager = ConnectionManager(bus=LocalEventBus())
+    await manager.start()
+    socket = _BlockingSocket()
+    await manager.connect(socket, "client")
+    try:
+        deltas = [
+            _delta(1, "step", "s1", {"done": True}),
+            _delta(2, "step", "s1", {"done": False}),
+            _delta(3, "step", "s1", {"content": "新内容"}),
+            _delta(4, "step", "s1", {"done": True}),
+            _delta(5, "task", "t", {"title": "标题"}),
+            _delta(6, "step", "s2", {"done": True}),
+        ]
+        for delta in deltas:
+            await manager.publish(delta, [event_topic("delta")], coalesce_key=delta_coalesce_key(delta))
+        socket.release.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+        # seq 1 已在发送中；seq 2 被同一步骤同一字段的 seq 4 替换并排到队尾，发出的序号严格递增
+        assert [message["seq"] for message in socket.sent] == [1, 3, 4, 5, 6]
+    finally:
+        manager.disconnect(socket, "client")
+        await manager.stop()
+
+def test_full_send_queue_still_accepts_coalesced_replacements():
+    connection = ClientConnection(_BlockingSocket(), "client", queue_size=2)
+    assert connection.enqueue("a", "k1")
+    assert connection.enqueue("b")
+    assert not connection.enqueue("c")
+    assert connection.enqueue("a2", "k1")
+    assert list(connection.pending.values()) == ["b", "a2"]
@@ -1,65 +1,281 @@
+import os
 import asyncio
 import json
 import structlog
-from typing import Dict, Set
-from fastapi import WebSocket, WebSocketDisconnect
-from uuid import UUID
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from fastapi import WebSocket
+
+from event_bus import LocalEventBus, create_event_bus
+from metrics import registry
 
 logger = structlog.get_logger()
 
+WS_SEND_QUEUE_SIZE = int(os.getenv("TASKAGENT_WS_SEND_QUEUE_SIZE", "256"))
+# 发送队列满时的策略：disconnect 断开慢客户端，drop 丢弃新消息
+WS_SLOW_CONSUMER_POLICY = os.getenv("TASKAGENT_WS_SLOW_CONSUMER_POLICY", "disconnect")
+
+WS_DROPPED = registry.counter(
+    "taskagent_ws_dropped_messages_total", "Messages not queued because a send queue was full", ("policy",)
+)
+
+class ClientConnection:
+    """单个WebSocket连接：有界发送队列 + 独立的发送协程"""
+
+    def __init__(self, websocket: WebSocket, client_id: str, queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.queue_size = queue_size
+        # 待发送的消息，按入队顺序：合并键（不可合并的消息用自增序号）-> 消息文本
+        self.pending: "OrderedDict[Union[str, int], str]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._next_id = 0
+        self.dropped = 0
+        self.writer: Optional[asyncio.Task] = None
+        # 已订阅的主题；为空表示接收全部消息（兼容未订阅的旧客户端）
+        self.topics: Set[str] = set()
+
+    def start(self, on_error):
+        self.writer = asyncio.create_task(self._write_loop(on_error))
+
+    def enqueue(self, text: str, coalesce_key: Optional[str] = None) -> bool:
+        """非阻塞入队；队列已满返回False"""
+        if coalesce_key is not None and coalesce_key in self.pending:
+            # 同一对象的更新还没发出：删掉旧消息，最新内容排到队尾，
+            # 这样发出的增量序号仍然递增，客户端按序号发现跳跃后通过 since 接口补齐
+            del self.pending[coalesce_key]
+        elif len(self.pending) >= self.queue_size:
+            return False
+        elif coalesce_key is None:
+            coalesce_key = self._next_id
+            self._next_id += 1
+        self.pending[coalesce_key] = text
+        self._ready.set()
+        return True
+
+    async def _write_loop(self, on_error):
+        try:
+            while True:
+                while not self.pending:
+                    self._ready.clear()
+                    await self._ready.wait()
+                _, text = self.pending.popitem(last=False)
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Failed to send message", client_id=self.client_id, error=str(e))
+            on_error(self)
+
+    async def close(self, code: int = 1000):
+        if self.writer and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+def task_topic(task_id: str) -> str:
+    return f"task:{task_id}"
+
+def event_topic(event_type: str) -> str:
+    return f"event:{event_type}"
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+    def __init__(self, bus: Optional[LocalEventBus] = None):
+        # 事件总线把消息转发给其他worker进程上的连接
+        self.bus = bus or create_event_bus()
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+        self._by_socket: Dict[WebSocket, ClientConnection] = {}
+        # 主题 -> 订阅连接；未订阅任何主题的连接在 _unfiltered 中
+        self.topic_index: Dict[str, Set[ClientConnection]] = {}
+        self._unfiltered: Set[ClientConnection] = set()
+
+    async def start(self):
+        await self.bus.start(self._deliver_local)
+
+    async def stop(self):
+        await self.bus.stop()
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
+        connection = ClientConnection(websocket, client_id)
+        connection.start(self._drop)
         if client_id not in self.active_connections:
             self.active_connections[client_id] = set()
-        self.active_connections[client_id].add(websocket)
+        self.active_connections[client_id].add(connection)
+        self._by_socket[websocket] = connection
+        self._unfiltered.add(connection)
         logger.info("WebSocket connected", client_id=client_id)
 
     def disconnect(self, websocket: WebSocket, client_id: str):
+        connection = self._by_socket.pop(websocket, None)
+        if connection is None:
+            return
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        self._unfiltered.discard(connection)
+        self._remove_topics(connection, set(connection.topics))
         if client_id in self.active_connections:
-            self.active_connections[client_id].discard(websocket)
+            self.active_connections[client_id].discard(connection)
             if not self.active_connections[client_id]:
                 del self.active_connections[client_id]
         logger.info("WebSocket disconnected", client_id=client_id)
 
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> Set[str]:
+        """订阅主题，返回该连接当前的全部订阅"""
+        connection = self._by_socket.get(websocket)
+        if connection is None:
+            return set()
+        for topic in topics:
+            connection.topics.add(topic)
+            self.topic_index.setdefault(topic, set()).add(connection)
+        if connection.topics:
+            self._unfiltered.discard(connection)
+        return set(connection.topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> Set[str]:
+        """取消订阅；取消全部订阅后恢复接收所有消息"""
+        connection = self._by_socket.get(websocket)
+        if connection is None:
+            return set()
+        self._remove_topics(connection, set(topics))
+        if not connection.topics:
+            self._unfiltered.add(connection)
+        return set(connection.topics)
+
+    def queue_stats(self) -> Dict[Tuple[str, ...], float]:
+        """各连接发送队列中等待的消息数（合并消息按一条计）"""
+        depths = [len(connection.pending) for connection in self._by_socket.values()]
+        return {("total",): sum(depths), ("max",): max(depths, default=0)}
+
+    def _remove_topics(self, connection: ClientConnection, topics: Set[str]):
+        for topic in topics & connection.topics:
+            connection.topics.discard(topic)
+            subscribers = self.topic_index.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.topic_index[topic]
+
+    def _drop(self, connection: ClientConnection):
+        """发送失败的连接立即移除"""
+        self.disconnect(connection.websocket, connection.client_id)
+
+    def _deliver(self, connection: ClientConnection, text: str, coalesce_key: Optional[str] = None):
+        if connection.enqueue(text, coalesce_key):
+            return
+        
+        connection.dropped += 1
+        WS_DROPPED.inc(WS_SLOW_CONSUMER_POLICY)
+        if WS_SLOW_CONSUMER_POLICY == "drop":
+            return
+        
+        # 默认策略：慢客户端拖不住其他人，直接断开（1013: try again later）
+        logger.warning("Disconnecting slow WebSocket consumer", client_id=connection.client_id)
+        self.disconnect(connection.websocket, connection.client_id)
+        asyncio.create_task(connection.close(code=1013))
+
+    async def send_to(self, websocket: WebSocket, message: dict):
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            self._deliver(connection, json.dumps(message))
+
     async def send_personal_message(self, message: dict, client_id: str):
-        if client_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[client_id]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error("Failed to send message", error=str(e))
-                    disconnected.append(connection)
-            
-            # Clean up disconnected connections
-            for conn in disconnected:
-                self.disconnect(conn, client_id)
-
-    async def broadcast(self, message: dict, exclude_client: str = None):
-        for client_id, connections in self.active_connections.items():
-            if client_id != exclude_client:
-                for connection in connections:
-                    try:
-                        await connection.send_text(json.dumps(message))
-                    except Exception as e:
-                        logger.error("Failed to broadcast", error=str(e))
+        text = json.dumps(message)
+        for connection in list(self.active_connections.get(client_id, ())):
+            self._deliver(connection, text)
+
+    async def publish(self, message: dict, topics: Iterable[str], coalesce_key: Optional[str] = None):
+        """只发送给订阅了任一主题的连接，以及未设置订阅的连接（包括其他worker上的连接）"""
+        # 每条消息只序列化一次
+        text = json.dumps(message)
+        topics = list(topics)
+        await self._deliver_local(text, topics, coalesce_key)
+        await self.bus.publish(text, topics, coalesce_key)
+
+    async def publish_many(self, messages: List[Tuple[dict, Iterable[str], Optional[str]]]):
+        """依次发布多条 (消息, 主题, 合并键)，转发给其他worker的事件一次批量写入总线"""
+        events = []
+        for message, topics, coalesce_key in messages:
+            text = json.dumps(message)
+            topics = list(topics)
+            await self._deliver_local(text, topics, coalesce_key)
+            events.append((text, topics, coalesce_key))
+        await self.bus.publish_many(events)
+
+    async def broadcast(self, message: dict, exclude_client: str = None, coalesce_key: Optional[str] = None):
+        text = json.dumps(message)
+        await self._deliver_local(text, None, coalesce_key, exclude_client)
+        await self.bus.publish(text, None, coalesce_key)
+
+    async def _deliver_local(
+        self,
+        text: str,
+        topics: Optional[List[str]],
+        coalesce_key: Optional[str] = None,
+        exclude_client: Optional[str] = None
+    ):
+        """投递给本进程的连接；topics为None表示广播给所有连接"""
+        if topics is None:
+            recipients = [
+                connection
+                for client_id, connections in self.active_connections.items()
+                if client_id != exclude_client
+                for connection in connections
+            ]
+        else:
+            recipients = set(self._unfiltered)
+            for topic in topics:
+                recipients.update(self.topic_index.get(topic, ()))
+        if not recipients:
+            return
+        
+        # 放入各连接的发送队列，由各自的发送协程并发发送
+        for connection in list(recipients):
+            self._deliver(connection, text, coalesce_key)
+        # 让出事件循环，使各连接的发送协程有机会在连续广播之间消费队列
+        await asyncio.sleep(0)
 
 manager = ConnectionManager()
 
-async def notify_step_update(task_id: str, step_id: str, done: bool):
-    """通知步骤状态更新"""
+registry.gauge(
+    "taskagent_ws_connections", "Open WebSocket connections in this process",
+    lambda: {(): len(manager._by_socket)}
+)
+registry.gauge(
+    "taskagent_ws_send_queue_depth", "Messages waiting in WebSocket send queues",
+    manager.queue_stats, ("stat",)
+)
+
+def delta_coalesce_key(delta: dict) -> Optional[str]:
+    """连续勾选/编辑同一步骤时，发送队列中尚未发出的旧增量由最新的一条替换。
+    按变化字段区分，被替换的增量只包含相同字段的旧值，不会丢失其他字段的变化；
+    客户端看到的 seq 会跳跃，需要时可通过 since 接口补齐"""
+    if delta["entity"] == "step" and delta["op"] == "updated":
+        return f"delta:step:{delta['id']}:{','.join(sorted(delta['data']))}"
+    return None
+
+async def notify_change(task_id: str, delta: dict):
+    """推送数据变更的增量事件（带单调递增的 seq）"""
+    await manager.publish(delta, [event_topic("delta"), task_topic(task_id)], coalesce_key=delta_coalesce_key(delta))
+
+async def notify_changes(deltas: List[Tuple[str, dict]]):
+    """按顺序推送一组 (任务ID, 增量事件)，例如批量接口的全部变更"""
+    await manager.publish_many([
+        (delta, [event_topic("delta"), task_topic(task_id)], delta_coalesce_key(delta))
+        for task_id, delta in deltas
+    ])
+
+async def notify_step_created(task_id: str, step: dict):
+    """通知流式拆解生成了新步骤"""
     message = {
-        "type": "step_update",
+        "type": "step_created",
         "task_id": task_id,
-        "step_id": step_id,
-        "done": done,
+        "step": step,
         "timestamp": str(asyncio.get_event_loop().time())
     }
-    await manager.broadcast(message)
+    await manager.publish(message, [event_topic("step_created"), task_topic(task_id)])
 
 async def notify_task_complete(task_id: str, summary: str):
     """通知任务完成"""
@@ -69,4 +285,4 @@ async def notify_task_complete(task_id: str, summary: str):
         "summary": summary,
         "timestamp": str(asyncio.get_event_loop().time())
     }
-    await manager.broadcast(message)
\ No newline at end of file
+    await manager.publish(message, [event_topic("task_complete"), task_topic(task_id)])
\ No newline at end of file
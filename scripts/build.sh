@@ -47,8 +47,13 @@ echo "Building executable..."
 pyinstaller --onefile \
     --name taskagentd \
     --add-data "requirements.txt:./" \
+    --add-data "step_rules.json:./" \
     --hidden-import="sqlmodel" \
+    --hidden-import="aiosqlite" \
     --hidden-import="openai" \
+    --hidden-import="pyarrow" \
+    --hidden-import="pyarrow.ipc" \
+    --hidden-import="pyarrow.parquet" \
     main.py
 
 # Copy executable to build directory